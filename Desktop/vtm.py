@@ -11,6 +11,7 @@ import logging
 import os
 import time
 import difflib
+import unicodedata
 import threading
 import speech_recognition as sr
 import json
@@ -19,12 +20,25 @@ import re
 import atexit
 import urllib.request
 import random
+import subprocess
+import signal
+import collections
+import queue as queue_mod
 import concurrent.futures
+import zlib
+import sqlite3
+import contextlib
 
 from yt_dlp import YoutubeDL
 import urllib.error
 import pyaudio
 from pydub import AudioSegment
+from pydub.utils import mediainfo, audioop
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # Opcional: sin numpy la etapa de ganancia usa audioop
 
 # --- Configuraciones y Rutas ---
 _SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -32,6 +46,9 @@ CONFIG_FILE = os.path.join(_SCRIPT_DIR, "config.json")
 FAV_FILE = os.path.join(_SCRIPT_DIR, "favorites.json")
 PLAYLIST_FILE = os.path.join(_SCRIPT_DIR, "playlists.json")
 TEMP_AUDIO_PREFIX = "vtm_local_"
+AUDIO_CACHE_DIR = os.path.join(_SCRIPT_DIR, "vtm_cache")
+METADATA_DB = os.path.join(_SCRIPT_DIR, "vtm_meta.db")
+PC_JOURNAL_FILE = os.path.join(_SCRIPT_DIR, "vtm_pc_journal.jsonl")
 
 AYUDA_MSG = (
     "\n📋 COMANDOS (VTM)\n\n"
@@ -40,7 +57,11 @@ AYUDA_MSG = (
     "- p                  Pausa / Reanudar (Toggle)\n"
     "- s / n / siguiente  Siguiente canción\n"
     "- stop / detener     Para la música\n"
+    "- cancelar           Cancela la búsqueda/descarga o importación en curso\n"
     "- replay / otra vez  Reinicia el tema actual\n"
+    "- adelanta [s]       Avanzar [s] segundos (10 por defecto)\n"
+    "- atrasa [s]         Retroceder [s] segundos (10 por defecto)\n"
+    "- ir a [m:ss]        Saltar a un punto del tema\n"
     "- ap / historial     Canciones que ya han sonado\n"
     "- r / shuffle / aleat Mezclar la cola actual\n"
     "- add / a [q]        Añadir a la cola sin interrumpir\n\n"
@@ -76,7 +97,9 @@ AYUDA_MSG = (
     "- salir / terminar   Cerrar la aplicación\n\n"
 
     "🧹 LIMPIEZA DE PLAYLISTS\n"
-    "- pc  [query]        Playlist Check: Verificar disponibilidad de canciones\n"
+    "- pc  [query]        Playlist Check: Verificar disponibilidad (solo las no verificadas recientemente)\n"
+    "- pcf [query]        Playlist Check Full: Re-verificar todas las canciones\n"
+    "- pcresume           Reanudar la última verificación interrumpida (pc/pcf/pcr/pcd/pcdr)\n"
     "- pcr [query]        Playlist Check Recovered: Ver solo canciones recuperadas\n"
     "- pcd [query]        Playlist Check Deep: Verificar disponibilidad de canciones en modo agresivo\n"
     "- pcdr [query]       Playlist Check Deep Recovered: Ver solo canciones recuperadas en modo agresivo\n"
@@ -93,6 +116,43 @@ class YtdlLogger:
     def error(self, msg):
         logging.error(f"yt-dlp: {msg}")
 
+# --- Tareas en segundo plano ---
+class JobCancelled(Exception):
+    """La tarea se canceló (otra petición más nueva, 'stop' o 'cancelar')."""
+
+class Job:
+    """Tarea larga (búsqueda + descarga, importación...) que corre fuera del hilo de comandos.
+       El trabajo llama a progress()/check() entre pasos: ahí informa y ahí se corta si se canceló."""
+    def __init__(self, kind, label, parent=None):
+        self.kind = kind
+        self.label = label
+        self.status = "iniciando"
+        self.parent = parent # Subtarea: se cancela también si se cancela la tarea padre
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check(self):
+        if self.cancelled: raise JobCancelled()
+
+    def progress(self, status):
+        self.check()
+        self.status = status
+        logging.info(f"⏳ [{self.label}] {status}")
+
+# El hook de progreso de yt-dlp es fijo (las instancias del pool se reutilizan);
+# cada descarga registra su propio callback en una variable local del hilo.
+_download_progress = threading.local()
+
+def _ytdl_progress_hook(d):
+    cb = getattr(_download_progress, "cb", None)
+    if cb: cb(d)
+
 def _get_ytdl_opts(download=False, playlist_items=None, quiet=True, outtmpl=None):
     opts = {
         'format': 'bestaudio/best',
@@ -104,7 +164,9 @@ def _get_ytdl_opts(download=False, playlist_items=None, quiet=True, outtmpl=None
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
     }
-    if not download:
+    if download:
+        opts['progress_hooks'] = [_ytdl_progress_hook]
+    else:
         opts.update({'extract_flat': True, 'lazy_playlist': True})
     if playlist_items:
         opts['playlist_items'] = playlist_items
@@ -112,6 +174,136 @@ def _get_ytdl_opts(download=False, playlist_items=None, quiet=True, outtmpl=None
         opts['outtmpl'] = outtmpl
     return opts
 
+class YtdlPool:
+    """Extractores YoutubeDL ya inicializados y reutilizables, agrupados por perfil de opciones.
+       Crear un YoutubeDL (extractores, cookies, red) cuesta bastante más que la llamada en sí para
+       consultas pequeñas; aquí cada hilo toma uno en exclusiva y lo devuelve al terminar, así que
+       ninguna instancia se comparte entre hilos a la vez.
+       outtmpl no forma parte del perfil: se fija en cada préstamo.
+    """
+    MAX_IDLE = 8 # por perfil
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0}
+
+    @staticmethod
+    def _profile(opts):
+        logger = opts.get("logger")
+        return repr(sorted((k, v) for k, v in opts.items() if k not in ("logger", "outtmpl"))) + type(logger).__name__
+
+    @contextlib.contextmanager
+    def acquire(self, opts):
+        key = self._profile(opts)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            ydl = idle.pop() if idle else None
+        if ydl is None:
+            ydl = YoutubeDL(dict(opts))
+            self.stats["created"] += 1
+        else:
+            self.stats["reused"] += 1
+        if opts.get("outtmpl"):
+            ydl.params["outtmpl"]["default"] = opts["outtmpl"]
+        try:
+            yield ydl
+        finally:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.MAX_IDLE:
+                    idle.append(ydl)
+                    ydl = None
+            if ydl is not None:
+                ydl.close()
+
+YTDL_POOL = YtdlPool()
+
+def _is_throttle_error(exc):
+    """¿YouTube nos está frenando? (HTTP 429, timeouts o el aviso de bot). No es lo mismo que un vídeo borrado."""
+    msg = str(exc).lower()
+    return isinstance(exc, TimeoutError) or any(k in msg for k in ("429", "too many requests", "timed out", "not a bot"))
+
+class AdaptiveLimiter:
+    """Control de ritmo para verificaciones masivas (pc, fc): concurrencia AIMD + cubo de tokens.
+       Como en TCP: hasta el primer aviso cada respuesta correcta suma 1 hilo y 1 req/s (arranque
+       rápido); después, ~1 hilo por ventana completa. Un 429/timeout divide ambos a la mitad (una vez
+       por 'cooldown') y vacía el cubo para que todos los hilos paren un momento antes del baneo.
+    """
+    def __init__(self, start=4, max_limit=16, rate=5.0, max_rate=20.0, cooldown=2.0):
+        self.limit = float(max(1, start))
+        self.max_limit = max(self.limit, max_limit)
+        self.rate = float(rate)
+        self.max_rate = max(self.rate, max_rate)
+        self.cooldown = cooldown
+        self._tokens = 1.0
+        self._stamp = time.monotonic()
+        self._last_cut = 0.0
+        self._inflight = 0
+        self._slow_start = True
+        self._cond = threading.Condition()
+        self.stats = {"ok": 0, "throttled": 0, "peak": int(self.limit)}
+
+    def _take_token(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def _release(self, throttled):
+        with self._cond:
+            self._inflight -= 1
+            if throttled:
+                self.stats["throttled"] += 1
+                now = time.monotonic()
+                if now - self._last_cut >= self.cooldown: # varios hilos fallan a la vez por la misma ráfaga
+                    self._last_cut = now
+                    self._slow_start = False
+                    self.limit = max(1.0, self.limit / 2)
+                    self.rate = max(0.5, self.rate / 2)
+                    self._tokens = -self.rate * self.cooldown
+                    logging.warning(f"🐢 YouTube está frenando: bajando a {int(self.limit)} hilos y {self.rate:.1f} req/s")
+            else:
+                self.stats["ok"] += 1
+                step = 1.0 if self._slow_start else 1 / self.limit
+                self.limit = min(self.max_limit, self.limit + step)
+                self.rate = min(self.max_rate, self.rate + (1.0 if self._slow_start else 1 / self.rate))
+                self.stats["peak"] = max(self.stats["peak"], int(self.limit))
+            self._cond.notify_all()
+
+    def run(self, fn, retries=3):
+        """Ejecuta fn() respetando el límite; si YouTube frena, reintenta tras el parón.
+           Si sigue frenando tras 'retries' reintentos, propaga la excepción."""
+        for attempt in range(retries + 1):
+            with self._cond:
+                while self._inflight >= int(self.limit):
+                    self._cond.wait()
+                self._inflight += 1
+            try:
+                self._take_token()
+                result = fn()
+            except Exception as e:
+                throttled = _is_throttle_error(e)
+                self._release(throttled)
+                if not throttled or attempt == retries: raise
+                continue
+            self._release(False)
+            return result
+
+    def summary(self):
+        return f"{int(self.limit)} hilos, {self.rate:.1f} req/s (máx. {self.stats['peak']} hilos, {self.stats['throttled']} avisos de YouTube)"
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(start=config.get("pc_threads", 4), max_limit=config.get("pc_max_threads", 16),
+                   rate=config.get("pc_rate", 5.0), max_rate=config.get("pc_max_rate", 20.0))
+
 # --- Gestión de Configuración ---
 def load_config():
     defaults = {
@@ -127,7 +319,10 @@ def load_config():
         "listen_enabled": True,
         "max_volume": 0.2,
         "min_volume": 0.0,
-        "rel_steps": 50
+        "rel_steps": 50,
+        "stream_decode": True,
+        "audio_cache_mb": 1024,
+        "metadata_ttl_hours": 24
     }
     if not os.path.exists(CONFIG_FILE):
         return defaults
@@ -215,6 +410,162 @@ def save_playlists(plist):
     except Exception as e:
         logging.error(f"Error guardando playlists: {e}")
 
+def _append_pc_journal(entry):
+    """Añade una línea al diario de la verificación de playlists en curso (se abre en cada escritura:
+       así lo ya comprobado queda en disco aunque el proceso muera a mitad)."""
+    try:
+        with open(PC_JOURNAL_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except Exception as e:
+        logging.error(f"Error escribiendo el diario de verificación: {e}")
+
+def _read_pc_journal():
+    """Devuelve (cabecera, {(pid, índice): resultado}) del diario, o (None, {}) si no hay ninguno.
+       Una última línea a medias (corte durante la escritura) se ignora."""
+    header, done = None, {}
+    try:
+        with open(PC_JOURNAL_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try: entry = json.loads(line)
+                except ValueError: continue
+                if "pid" in entry: done[(entry["pid"], entry["idx"])] = entry
+                else: header = entry
+    except OSError:
+        pass
+    return header, done
+
+
+# --- Metadatos persistentes (SQLite) ---
+class MetadataStore:
+    """Metadatos por id de vídeo (título, duración, autor, disponibilidad) persistidos en SQLite.
+       Todas las rutas que consultan YouTube (búsqueda, radio, playlists, favoritos, ensure)
+       miran aquí antes de llamar a yt-dlp; una entrada vale mientras no supere el TTL.
+    """
+    def __init__(self, path, ttl_hours=24, recs_ttl_hours=12, recs_max=500):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.recs_ttl = recs_ttl_hours * 3600
+        self.recs_max = recs_max
+        self.stats = {"hits": 0, "misses": 0, "recs_hits": 0, "recs_misses": 0}
+        self._conn = None # Se abre al primer uso
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS videos ("
+                " id TEXT PRIMARY KEY, title TEXT, duration REAL, uploader TEXT,"
+                " available INTEGER, last_seen_available REAL, last_checked REAL)"
+            )
+            # Listas de recomendaciones (mix RD<id>) por vídeo semilla
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations ("
+                " seed TEXT PRIMARY KEY, entries TEXT, fetched REAL, last_used REAL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def set_ttl(self, ttl_hours, recs_ttl_hours=None, recs_max=None):
+        self.ttl = ttl_hours * 3600
+        if recs_ttl_hours is not None: self.recs_ttl = recs_ttl_hours * 3600
+        if recs_max is not None: self.recs_max = recs_max
+
+    def get_recs(self, seed):
+        """Recomendaciones cacheadas para 'seed' si no han caducado; None si hay que pedirlas."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT entries, fetched FROM recommendations WHERE seed = ?", (seed,)).fetchone()
+            if row and now - row[1] < self.recs_ttl:
+                db.execute("UPDATE recommendations SET last_used = ? WHERE seed = ?", (now, seed))
+                db.commit()
+                self.stats["recs_hits"] += 1
+                return json.loads(row[0])
+        self.stats["recs_misses"] += 1
+        return None
+
+    def put_recs(self, seed, entries):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO recommendations (seed, entries, fetched, last_used) VALUES (?, ?, ?, ?)",
+                       (seed, json.dumps(entries), now, now))
+            # Tope de tamaño: fuera las semillas menos usadas
+            db.execute("DELETE FROM recommendations WHERE seed NOT IN"
+                       " (SELECT seed FROM recommendations ORDER BY last_used DESC LIMIT ?)", (self.recs_max,))
+            db.commit()
+
+    def get(self, video_id, max_age=None):
+        """Entrada como dict si existe y se comprobó hace menos de max_age (TTL por defecto)."""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            row = self._db().execute(
+                "SELECT id, title, duration, uploader, available, last_seen_available, last_checked FROM videos WHERE id = ?",
+                (video_id,)
+            ).fetchone()
+        if row and time.time() - (row[6] or 0) < max_age:
+            self.stats["hits"] += 1
+            return dict(zip(("id", "title", "duration", "uploader", "available", "last_seen_available", "last_checked"), row))
+        self.stats["misses"] += 1
+        return None
+
+    def record(self, info, available=True):
+        """Guarda lo que sepamos de un vídeo. Los campos que falten no pisan los ya guardados."""
+        self.record_many([info], available)
+
+    def record_many(self, infos, available=True):
+        now = time.time()
+        rows = [(i["id"], i.get("title"), i.get("duration"), i.get("uploader") or i.get("channel"),
+                 int(available), now if available else None, now)
+                for i in infos if i and i.get("id")]
+        if not rows: return
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT INTO videos (id, title, duration, uploader, available, last_seen_available, last_checked)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET"
+                "  title = COALESCE(excluded.title, title), duration = COALESCE(excluded.duration, duration),"
+                "  uploader = COALESCE(excluded.uploader, uploader), available = excluded.available,"
+                "  last_seen_available = COALESCE(excluded.last_seen_available, last_seen_available),"
+                "  last_checked = excluded.last_checked",
+                rows
+            )
+            db.commit()
+
+METADATA = MetadataStore(METADATA_DB)
+_BARE_ID_RE = re.compile(r"^[\w-]{11}$")
+_GONE_MARKERS = ("video unavailable", "this video is unavailable", "no longer available", "private video",
+                 "has been removed", "been terminated", "account associated with this video")
+
+def _is_gone_error(exc):
+    """¿El error dice que el vídeo ya no existe (borrado, privado, cuenta cerrada)?"""
+    msg = str(exc).lower()
+    return any(k in msg for k in _GONE_MARKERS)
+
+def check_video_available(ydl, video_id, use_store=True, limiter=None):
+    """Disponibilidad de un vídeo: primero el almacén de metadatos, si no, una extracción con yt-dlp.
+       Con 'limiter' la petición pasa por su control de ritmo, y si YouTube sigue frenando
+       se propaga la excepción en vez de dar el vídeo por no disponible.
+       Devuelve (disponible, info o None)."""
+    if use_store:
+        known = METADATA.get(video_id)
+        if known:
+            return bool(known["available"]), known
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    try:
+        if limiter: info = limiter.run(lambda: ydl.extract_info(url, download=False))
+        else: info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        if limiter and _is_throttle_error(e): raise
+        # Solo se recuerda como no disponible si YouTube lo dice claramente; un fallo de red,
+        # un 429 o un error del extractor no deben marcar un vídeo vivo como muerto durante todo el TTL.
+        if _is_gone_error(e): METADATA.record({"id": video_id}, available=False)
+        return False, None
+    if info and not info.get("id"): info["id"] = video_id
+    METADATA.record(info)
+    return True, info
 
 # --- Filtrado y Búsqueda ---
 def is_content_allowed(info, config):
@@ -231,58 +582,998 @@ def is_content_allowed(info, config):
     
     return info.get("_type", "video") in ["video", "url", "url_transparent"]
 
+# Caché de páginas de resultados: recorrer los índices 0..9 de una misma búsqueda
+# (play_query, radio) cuesta una sola extracción de red en lugar de una por índice.
+SEARCH_CACHE_TTL = 600 # segundos
+SEARCH_CACHE_MAX = 64 # búsquedas recordadas (LRU)
+_search_cache = collections.OrderedDict() # query -> (timestamp, resultado de extract_info)
+_search_cache_lock = threading.Lock()
+
+def _search_page(search_query, opts):
+    now = time.time()
+    with _search_cache_lock:
+        cached = _search_cache.get(search_query)
+        if cached and now - cached[0] < SEARCH_CACHE_TTL:
+            _search_cache.move_to_end(search_query)
+            return cached[1]
+    with YTDL_POOL.acquire(opts) as ydl:
+        res = ydl.extract_info(search_query, download=False)
+    if res:
+        if res.get("entries") is not None:
+            res["entries"] = list(res["entries"]) # Materializar (puede ser perezosa) para indexar y cachear
+            METADATA.record_many(res["entries"])
+        elif res.get("id"):
+            METADATA.record(res)
+        with _search_cache_lock:
+            _search_cache[search_query] = (now, res)
+            _search_cache.move_to_end(search_query)
+            while len(_search_cache) > SEARCH_CACHE_MAX:
+                _search_cache.popitem(last=False)
+    return res
+
+def get_search_entries(query: str):
+    """Página completa de resultados (metadatos planos, sin resolver), desde la caché si es reciente."""
+    is_url = query.startswith("http")
+    try:
+        res = _search_page(query if is_url else f"ytsearch10:{query}", _get_ytdl_opts(playlist_items='1-10'))
+    except Exception as e:
+        logging.error(f"Error búsqueda: {e}")
+        return []
+    return [dict(e) for e in (res or {}).get("entries") or [] if e]
+
 def get_search_info(query: str, index: int = 0):
+    # Id desnudo (playlists, favoritos, radio): si el almacén lo conoce como disponible, no hay red
+    if index == 0 and _BARE_ID_RE.match(query):
+        known = METADATA.get(query)
+        if known and known["available"] and known["title"]:
+            page = f"https://www.youtube.com/watch?v={query}"
+            return {"id": query, "title": known["title"], "duration": known["duration"] or 0,
+                    "uploader": known["uploader"], "url": page, "webpage_url": page, "_type": "url"}
+
     is_url = query.startswith("http")
     search_query = query if is_url else f"ytsearch10:{query}"
     opts = _get_ytdl_opts(playlist_items='1-10')
     
     try:
-        with YoutubeDL(opts) as ydl:
-            res = ydl.extract_info(search_query, download=False)
-            if not res: return None
-            
-            entries = res.get("entries", [])
-            if not entries and "title" in res:
-                if "url" not in res and "webpage_url" in res: res["url"] = res["webpage_url"]
-                return res
-            
-            if index < len(entries):
-                entry = entries[index]
-                e_url = entry.get("url") or entry.get("webpage_url")
-                e_type = entry.get("_type", "video")
-
-                if not entry.get("duration") and e_url and e_type in ["url", "url_transparent"]:
-                    with YoutubeDL(opts) as ydl2:
-                        full_info = ydl2.extract_info(e_url, download=False)
-                        if full_info and full_info.get("_type") == "playlist":
-                            full_info["_type"] = "playlist"
-                        return full_info
-                return entry
+        res = _search_page(search_query, opts)
+        if not res: return None
+        
+        # Copias: los llamantes marcan los dicts (_is_plist, update...) y no deben ensuciar la caché
+        entries = res.get("entries", [])
+        if not entries and "title" in res:
+            res = dict(res)
+            if "url" not in res and "webpage_url" in res: res["url"] = res["webpage_url"]
+            return res
+        
+        if index < len(entries):
+            entry = entries[index]
+            e_url = entry.get("url") or entry.get("webpage_url")
+            e_type = entry.get("_type", "video")
+
+            if not entry.get("duration") and e_url and e_type in ["url", "url_transparent"]:
+                with YTDL_POOL.acquire(opts) as ydl2:
+                    full_info = ydl2.extract_info(e_url, download=False)
+                    if full_info and full_info.get("_type") == "playlist":
+                        full_info["_type"] = "playlist"
+                    if full_info:
+                        entries[index] = full_info # La página cacheada ya queda resuelta para este índice
+                        METADATA.record(full_info)
+                        return dict(full_info)
+                    return None
+            return dict(entry)
     except Exception as e:
         logging.error(f"Error búsqueda: {e}")
     return None
 
-def download_media(url, prefix=TEMP_AUDIO_PREFIX):
+# --- Caché de audio en disco ---
+_VIDEO_ID_RE = re.compile(r"(?:[?&]v=|youtu\.be/|/shorts/)([\w-]{11})")
+
+def extract_video_id(url):
+    m = _VIDEO_ID_RE.search(url or "")
+    return m.group(1) if m else None
+
+def _file_crc32(path):
+    crc = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+class AudioCache:
+    """Caché persistente de audios descargados, por id de vídeo.
+       - Presupuesto de tamaño (MB) con expulsión LRU; nunca expulsa lo que está sonando o a punto de sonar.
+       - Integridad: tamaño y CRC32 guardados al insertar; el tamaño se mira en cada acierto y el CRC
+         una vez por sesión o si el archivo cambió. Un archivo dañado o truncado se descarta y cuenta como fallo.
+       - Índice en index.json dentro del directorio, escrito de forma atómica.
+    """
+    def __init__(self, directory, max_mb=1024):
+        self.dir = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.stats = {"hits": 0, "misses": 0, "corrupt": 0, "evicted": 0}
+        self._in_use = lambda: ()
+        self._verified = {} # video_id -> (tamaño, mtime) ya comprobados con CRC en esta sesión
+        self._lock = threading.Lock()
+        self._index = None # Se carga al primer uso
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def set_budget(self, max_mb):
+        with self._lock:
+            self.max_bytes = int(max_mb * 1024 * 1024)
+            if self._index is not None: self._evict()
+
+    def set_in_use(self, paths_fn):
+        """paths_fn() devuelve las rutas que no se pueden expulsar (sonando, precargada, armada,
+           ya descargadas en la cola). Se consulta solo al expulsar."""
+        self._in_use = paths_fn
+
+    def owns(self, path):
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.dir)
+
+    def _load(self):
+        if self._index is not None: return
+        os.makedirs(self.dir, exist_ok=True)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        # Reconciliar índice y disco: entradas sin archivo fuera, archivos huérfanos (descargas cortadas) fuera
+        index = {vid: e for vid, e in index.items() if os.path.exists(os.path.join(self.dir, e["file"]))}
+        known = {e["file"] for e in index.values()} | {"index.json"}
+        for f in os.listdir(self.dir):
+            if f not in known:
+                try: os.remove(os.path.join(self.dir, f))
+                except OSError: pass
+        self._index = index
+
+    def _save(self):
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._index, f)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            logging.error(f"Error guardando índice de caché: {e}")
+
+    def _drop(self, video_id):
+        self._verified.pop(video_id, None)
+        entry = self._index.pop(video_id, None)
+        if entry:
+            try: os.remove(os.path.join(self.dir, entry["file"]))
+            except OSError: pass
+
+    def _evict(self, reserve=0, replacing=None):
+        """Expulsa por LRU hasta que quepan 'reserve' bytes más. La entrada 'replacing' (la que se
+           va a sustituir) ni cuenta ni se expulsa aquí. Devuelve si hay sitio."""
+        total = reserve + sum(e["size"] for vid, e in self._index.items() if vid != replacing)
+        if total <= self.max_bytes: return True
+        in_use = {p for p in self._in_use() if p}
+        for vid, e in sorted(self._index.items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes: break
+            if vid == replacing: continue
+            path = os.path.join(self.dir, e["file"])
+            if path in in_use: continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue # Abierto por otro proceso (Windows): se intentará en la próxima
+            del self._index[vid]
+            self._verified.pop(vid, None)
+            total -= e["size"]
+            self.stats["evicted"] += 1
+        return total <= self.max_bytes
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, video_id):
+        """Ruta del audio en caché si existe y está íntegro; None (y cuenta un fallo) si no.
+           El CRC se comprueba la primera vez en la sesión o si el archivo cambió (tamaño/mtime),
+           y se calcula fuera del lock para que summary() e info no esperen a leer el archivo."""
+        if not self.enabled or not video_id: return None
+        with self._lock:
+            self._load()
+            entry = self._index.get(video_id)
+            if not entry:
+                self.stats["misses"] += 1
+                return None
+            path = os.path.join(self.dir, entry["file"])
+            stamp = self._stamp(path)
+            size_ok = stamp is not None and stamp[0] == entry["size"]
+            needs_crc = size_ok and self._verified.get(video_id) != stamp
+        crc_ok = True
+        if needs_crc:
+            try: crc_ok = _file_crc32(path) == entry["crc32"]
+            except OSError: crc_ok = False
+        with self._lock:
+            if self._index.get(video_id) is not entry: # Sustituida o expulsada mientras tanto
+                self.stats["misses"] += 1
+                return None
+            if size_ok and crc_ok:
+                self._verified[video_id] = stamp
+                entry["last_used"] = time.time()
+                entry["hits"] = entry.get("hits", 0) + 1
+                self.stats["hits"] += 1
+                self._save()
+                return path
+            logging.warning(f"⚠️ Caché: audio de {video_id} dañado, se descarta")
+            self.stats["corrupt"] += 1
+            self._drop(video_id)
+            self._save()
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, video_id, filepath):
+        """Mueve una descarga recién terminada a la caché y devuelve su nueva ruta.
+           Si no cabe (más grande que el presupuesto, o el resto está en uso), se queda donde está."""
+        if not self.enabled or not video_id: return filepath
+        with self._lock:
+            self._load()
+            name = video_id + os.path.splitext(filepath)[1]
+            dest = os.path.join(self.dir, name)
+            try:
+                size = os.path.getsize(filepath)
+                if size == 0: return filepath
+                if not self._evict(reserve=size, replacing=video_id):
+                    self._save()
+                    logging.info(f"💾 Caché: {video_id} no cabe en {self.max_bytes // (1024 * 1024)} MB, se usa sin cachear")
+                    return filepath
+                crc = _file_crc32(filepath)
+                self._drop(video_id)
+                os.replace(filepath, dest)
+            except OSError as e:
+                logging.warning(f"⚠️ No se pudo guardar en caché {video_id}: {e}")
+                return filepath
+            self._index[video_id] = {"file": name, "size": size, "crc32": crc, "last_used": time.time(), "hits": 0}
+            self._verified[video_id] = self._stamp(dest)
+            self._save()
+            return dest
+
+    def summary(self):
+        with self._lock:
+            self._load()
+            used = sum(e["size"] for e in self._index.values())
+            return len(self._index), used
+
+AUDIO_CACHE = AudioCache(AUDIO_CACHE_DIR)
+
+def download_media(url, prefix=TEMP_AUDIO_PREFIX, video_id=None, job=None):
     if not url: return None
+    video_id = video_id or extract_video_id(url)
+    cached = AUDIO_CACHE.get(video_id)
+    if cached:
+        logging.info(f"💾 Audio en caché: {video_id}")
+        return cached
     filepath = os.path.join(_SCRIPT_DIR, f"{prefix}{uuid.uuid4()}.m4a")
     opts = _get_ytdl_opts(download=True, outtmpl=filepath)
+    if job:
+        step = [0]
+        def on_progress(d):
+            job.check() # Lanzar aquí aborta la descarga dentro de yt-dlp
+            total = d.get("total_bytes") or d.get("total_bytes_estimate")
+            if d.get("status") == "downloading" and total:
+                pct = int(d.get("downloaded_bytes", 0) * 100 / total)
+                if pct >= step[0] + 25:
+                    step[0] = pct - pct % 25
+                    job.progress(f"Descargando {step[0]}%")
+        _download_progress.cb = on_progress
     try:
-        with YoutubeDL(opts) as ydl:
-            if ydl.download([url]) == 0 and os.path.exists(filepath):
-                return filepath
+        with YTDL_POOL.acquire(opts) as ydl:
+            # extract_info en vez de download(): el código de retorno de download() se arrastra entre usos
+            info = ydl.extract_info(url, download=True)
+            if info and os.path.exists(filepath):
+                if video_id: METADATA.record({"id": video_id, "title": info.get("title"), "duration": info.get("duration"), "uploader": info.get("uploader")})
+                return AUDIO_CACHE.put(video_id, filepath)
     except Exception as e:
-        logging.error(f"Error descarga: {e}")
+        if not (job and job.cancelled): # Si se canceló, yt-dlp puede haber envuelto la excepción del hook
+            logging.error(f"Error descarga: {e}")
+    finally:
+        _download_progress.cb = None
+    # Descarga fallida o cancelada: no dejar restos a medias
+    for leftover in (filepath, filepath + ".part"):
+        try: os.remove(leftover)
+        except OSError: pass
+    if job: job.check()
     return None
 
 def get_recommendations(video_id: str):
+    cached = METADATA.get_recs(video_id)
+    if cached is not None:
+        return cached
     url = f"https://www.youtube.com/watch?v={video_id}&list=RD{video_id}"
     opts = _get_ytdl_opts(playlist_items='1-15')
     try:
-        with YoutubeDL(opts) as ydl:
+        with YTDL_POOL.acquire(opts) as ydl:
              info = ydl.extract_info(url, download=False)
-             return [{"id": e["id"], "title": e["title"], "duration": e.get("duration")} for e in info.get("entries", []) if e]
+             recs = [{"id": e["id"], "title": e["title"], "duration": e.get("duration")} for e in info.get("entries", []) if e]
+             METADATA.record_many(recs)
+             if recs: METADATA.put_recs(video_id, recs)
+             return recs
     except: return []
 
+# --- Fuentes de audio (decodificación) ---
+OUTPUT_RATE = 44100
+OUTPUT_CHANNELS = 2
+OUTPUT_SAMPLE_WIDTH = 2
+
+class DecodeStats:
+    """Coste real de decodificar, separado en fuentes a frecuencia nativa y remuestreadas:
+       segundos de CPU de ffmpeg por segundo de audio entregado. La diferencia es lo que cuesta convertir."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {"native": [0, 0.0, 0.0], "resampled": [0, 0.0, 0.0]} # [fuentes, s de audio, s de CPU]
+
+    def opened(self, kind):
+        with self._lock:
+            self._data[kind][0] += 1
+
+    def add(self, kind, audio_s, cpu_s):
+        with self._lock:
+            self._data[kind][1] += audio_s
+            self._data[kind][2] += cpu_s
+
+    def describe(self, kind):
+        with self._lock:
+            count, audio_s, cpu_s = self._data[kind]
+        return f"{count}" + (f", {cpu_s * 1000 / audio_s:.1f} ms CPU/s" if audio_s >= 1 else "")
+
+DECODE_STATS = DecodeStats()
+
+def _kill_process(proc):
+    """Mata el proceso, espera a que termine y devuelve sus segundos de CPU (None si no se pueden medir)."""
+    if os.name == "nt":
+        proc.kill()
+        proc.wait(timeout=2)
+        try:
+            import ctypes
+            from ctypes import wintypes
+            times = [wintypes.FILETIME() for _ in range(4)] # creación, salida, kernel, usuario
+            if not ctypes.windll.kernel32.GetProcessTimes(int(proc._handle), *[ctypes.byref(t) for t in times]):
+                return None
+            return sum((t.dwHighDateTime << 32 | t.dwLowDateTime) for t in times[2:]) / 1e7
+        except Exception:
+            return None
+    # Popen.kill() haría poll() y recogería el proceso antes de poder leer su consumo con wait4
+    try: os.kill(proc.pid, signal.SIGKILL)
+    except OSError: pass
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        return usage.ru_utime + usage.ru_stime
+    except (ChildProcessError, AttributeError):
+        proc.wait(timeout=2)
+        return None
+
+def probe_audio(filepath):
+    """Duración y frecuencia nativa del archivo (ffprobe). Ceros si no se pueden leer."""
+    try:
+        info = mediainfo(filepath)
+        return float(info.get("duration") or 0), int(info.get("sample_rate") or 0)
+    except Exception:
+        return 0.0, 0
+
+class FFmpegSource:
+    """Decodificación en streaming: ffmpeg vuelca PCM s16le por un pipe y se lee por trozos.
+       El coste de arranque no depende de la duración del tema y en memoria solo vive el buffer del pipe.
+       Si rate difiere de la frecuencia nativa, ffmpeg remuestrea sobre la marcha (también en streaming).
+
+       Los primeros intro_s segundos decodificados se guardan: volver al inicio (replay) suena al
+       instante desde memoria mientras ffmpeg arranca justo detrás, sin decodificar nada dos veces.
+    """
+    def __init__(self, filepath, rate=OUTPUT_RATE, channels=OUTPUT_CHANNELS, duration=None, intro_s=2):
+        self.filepath = filepath
+        self.frame_rate = rate
+        self.channels = channels
+        self.sample_width = OUTPUT_SAMPLE_WIDTH
+        self.frame_bytes = channels * OUTPUT_SAMPLE_WIDTH
+        self.duration = duration if duration is not None else probe_audio(filepath)[0]
+        self._intro = bytearray()
+        self._intro_bytes = int(rate * intro_s) * self.frame_bytes
+        self._proc = None
+        self._decoded = 0 # bytes de PCM leídos del pipe
+        self._cpu_s = 0.0 # CPU de los ffmpeg ya terminados (un seek relanza el proceso)
+        self._spawn(0)
+
+    def _spawn(self, start_s):
+        cmd = [AudioSegment.converter, "-nostdin", "-hide_banner", "-loglevel", "error"]
+        if start_s > 0:
+            cmd += ["-ss", f"{start_s:.3f}"] # Antes de -i: salto directo en el contenedor
+        cmd += [
+            "-i", self.filepath, "-vn",
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", str(self.channels), "-ar", str(self.frame_rate), "pipe:1"
+        ]
+        self._proc = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+        )
+        self._from_start = start_s <= 0
+        if self._from_start:
+            self._intro = bytearray() # Se vuelve a capturar desde el principio
+        self._head = b"" # PCM ya decodificado (prime() o intro guardada)
+        self._head_pos = 0
+
+    def prime(self, seconds):
+        """Decodifica por adelantado los primeros segundos para que el arranque no espere a ffmpeg."""
+        self._head = self.read(int(self.frame_rate * seconds) * self.frame_bytes)
+        self._head_pos = 0
+
+    def seek(self, seconds):
+        """Salta a 'seconds' relanzando ffmpeg con -ss (coste constante, sin decodificar desde 0)."""
+        if not self._proc: return
+        self._kill()
+        if seconds <= 0 and len(self._intro) >= self._intro_bytes:
+            intro = bytes(self._intro)
+            self._spawn(len(intro) / (self.frame_rate * self.frame_bytes))
+            self._head = intro
+        else:
+            self._spawn(max(0.0, seconds))
+
+    def read(self, nbytes):
+        """Devuelve hasta nbytes de PCM (menos solo al final del tema, b'' en EOF)."""
+        proc = self._proc
+        if not proc: return b""
+        parts = []
+        remaining = nbytes
+        if self._head_pos < len(self._head):
+            data = self._head[self._head_pos:self._head_pos + nbytes]
+            self._head_pos += len(data)
+            parts.append(data)
+            remaining -= len(data)
+        try:
+            while remaining > 0:
+                data = proc.stdout.read(remaining)
+                if not data: break
+                self._decoded += len(data)
+                parts.append(data)
+                remaining -= len(data)
+                if self._from_start and len(self._intro) < self._intro_bytes:
+                    self._intro += data[:self._intro_bytes - len(self._intro)]
+        except (ValueError, OSError):
+            pass # Pipe cerrado desde otro hilo (stop)
+        data = b"".join(parts)
+        # Nunca devolver un frame a medias
+        return data[:len(data) - (len(data) % self.frame_bytes)]
+
+    def _kill(self):
+        proc, self._proc = self._proc, None
+        if not proc: return
+        try:
+            proc.stdout.close()
+            self._cpu_s += _kill_process(proc) or 0.0
+        except Exception: pass
+
+    def close(self):
+        if not self._proc: return
+        self._kill()
+        self._head = b""
+        self._intro = bytearray()
+        if self._cpu_s:
+            kind = "native" if getattr(self, "native_rate", self.frame_rate) == self.frame_rate else "resampled"
+            DECODE_STATS.add(kind, self._decoded / (self.frame_rate * self.frame_bytes), self._cpu_s)
+
+
+class SegmentSource:
+    """Modo clásico (stream_decode=false): decodifica el tema entero con pydub y lo sirve por trozos."""
+    def __init__(self, filepath, rate=OUTPUT_RATE, channels=OUTPUT_CHANNELS):
+        seg = AudioSegment.from_file(filepath)
+        seg = seg.set_frame_rate(rate).set_channels(channels).set_sample_width(OUTPUT_SAMPLE_WIDTH)
+        self.filepath = filepath
+        self.frame_rate = seg.frame_rate
+        self.channels = seg.channels
+        self.sample_width = seg.sample_width
+        self.frame_bytes = seg.frame_width
+        self.duration = len(seg) / 1000.0
+        self._data = seg.raw_data
+        self._pos = 0
+
+    def prime(self, seconds):
+        pass # Ya está decodificado entero
+
+    def seek(self, seconds):
+        self._pos = int(max(0.0, seconds) * self.frame_rate) * self.frame_bytes
+
+    def read(self, nbytes):
+        if self._data is None: return b""
+        data = self._data[self._pos:self._pos + nbytes]
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        self._data = None
+
+
+class GainStage:
+    """Etapa de volumen sobre PCM int16. La ganancia lineal se cachea al cambiar el volumen
+       (volumen 0.0-1.0 == factor lineal) y se aplica en punto fijo Q15 sobre buffers reutilizables.
+    """
+    Q15 = 1 << 15
+
+    def __init__(self, volume=1.0):
+        self._tmp = None
+        self._out = None
+        self.set_volume(volume)
+
+    def set_volume(self, vol_float):
+        self.linear = max(0.0, min(1.0, vol_float))
+        self._gain_q15 = int(round(self.linear * self.Q15))
+
+    def process(self, raw):
+        """Devuelve el chunk escalado. Con numpy es una vista de solo lectura sobre el buffer
+           interno: válida hasta la siguiente llamada.
+        """
+        if np is None:
+            return audioop.mul(raw, OUTPUT_SAMPLE_WIDTH, self.linear)
+        n = len(raw) // OUTPUT_SAMPLE_WIDTH
+        if self._out is None or len(self._out) < n:
+            self._tmp = np.empty(n, dtype=np.int32)
+            self._out = np.empty(n, dtype=np.int16)
+        tmp, out = self._tmp[:n], self._out[:n]
+        np.multiply(np.frombuffer(raw, dtype=np.int16, count=n), self._gain_q15, out=tmp, dtype=np.int32)
+        np.right_shift(tmp, 15, out=tmp)
+        np.copyto(out, tmp, casting="unsafe")
+        return memoryview(out).cast("B").toreadonly()
+
+
+class RingBuffer:
+    """Buffer circular de bytes sin locks para un único productor y un único consumidor.
+       Cada contador (_w, _r) solo lo avanza su propio hilo; las lecturas cruzadas son atómicas con el GIL.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._w = 0 # Total de bytes escritos (productor)
+        self._r = 0 # Total de bytes leídos (consumidor)
+
+    def fill(self):
+        return self._w - self._r
+
+    def free(self):
+        return self.capacity - (self._w - self._r)
+
+    def write(self, data):
+        """Productor: copia todo lo que quepa de data y devuelve los bytes escritos."""
+        n = min(len(data), self.free())
+        if n <= 0: return 0
+        start = self._w % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = data[:first]
+        if first < n:
+            self._buf[:n - first] = data[first:n]
+        self._w += n # Publicar al final: el consumidor nunca ve bytes a medio copiar
+        return n
+
+    def read(self, nbytes):
+        """Consumidor: devuelve hasta nbytes disponibles."""
+        n = min(nbytes, self._w - self._r)
+        if n <= 0: return b""
+        start = self._r % self.capacity
+        first = min(n, self.capacity - start)
+        data = bytes(self._buf[start:start + first])
+        if first < n:
+            data += self._buf[:n - first]
+        self._r += n
+        return data
+
+
+class AudioOutput:
+    """Salida PyAudio en modo callback. Un hilo productor llena el RingBuffer y el callback
+       de PortAudio lo vacía sin tocar ningún lock del reproductor.
+    """
+    def __init__(self, pa, rate, channels, buffer_ms=300, is_paused=None):
+        self.frame_rate = rate
+        self.channels = channels
+        self.frame_bytes = channels * OUTPUT_SAMPLE_WIDTH
+        frames = int(rate * buffer_ms / 1000)
+        self.ring = RingBuffer(frames * self.frame_bytes)
+        self.underruns = 0
+        self.idle = True # Sin fuente activa: el silencio no cuenta como underrun
+        self._priming = False # Tras un cambio de fuente el ring se rellena desde cero: tampoco cuenta
+        self._flush_to = None
+        self._is_paused = is_paused or (lambda: False)
+        self.stream = pa.open(
+            format=pa.get_format_from_width(OUTPUT_SAMPLE_WIDTH),
+            channels=channels,
+            rate=rate,
+            output=True,
+            stream_callback=self._callback
+        )
+
+    def request_flush(self, mark):
+        """Productor: descarta en el consumidor todo lo escrito antes de mark (cambio inmediato de fuente)."""
+        self._priming = True
+        self._flush_to = mark
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        ring = self.ring
+        mark, self._flush_to = self._flush_to, None
+        if mark is not None and mark > ring._r:
+            ring._r = mark
+        n = frame_count * self.frame_bytes
+        if self._is_paused():
+            return (bytes(n), pyaudio.paContinue)
+        data = ring.read(n)
+        if len(data) < n:
+            if not self.idle and not self._priming:
+                self.underruns += 1
+            data += bytes(n - len(data))
+        elif mark is None:
+            self._priming = False
+        return (data, pyaudio.paContinue)
+
+    def fill_ratio(self):
+        return self.ring.fill() / self.ring.capacity
+
+    def close(self):
+        stream, self.stream = self.stream, None
+        if not stream: return
+        try:
+            stream.stop_stream()
+            stream.close()
+        except Exception: pass
+
+
+_Segment = collections.namedtuple("_Segment", "mark tag duration notify seq offset_ms")
+
+class PlaybackEngine:
+    """Motor de salida persistente: un único stream PyAudio y un hilo productor de larga vida.
+       El productor cambia de fuente en el límite de pista (gapless) con fundido opcional,
+       así que entre canciones no se reabre el dispositivo ni se mete silencio.
+
+       Las órdenes (play/set_next/stop) se encolan y las aplica el propio productor entre chunks.
+       Cada cambio de pista deja una marca en el RingBuffer: la pista "audible" es la de la
+       última marca que el callback ya ha consumido.
+
+       Eventos (on_event(nombre, tag)), emitidos desde el productor cuando ya son audibles:
+         - "near_end": a la pista le queda menos de near_end_s (o del 20%): hora de precargar.
+         - "advanced": ha entrado la pista armada con set_next (transición gapless).
+         - "ended":    la pista se agotó sin siguiente; la salida queda en silencio.
+       play(), seek() y stop() no generan eventos: quien los llama ya sabe lo que ha pasado.
+    """
+    CHUNK_MS = 50
+
+    def __init__(self, pa, gain, buffer_ms=300, crossfade_ms=0, is_paused=None, on_event=None, near_end_s=20):
+        self._pa = pa
+        self._gain = gain
+        self._buffer_ms = buffer_ms
+        self.crossfade_ms = crossfade_ms
+        self._is_paused = is_paused or (lambda: False)
+        self._on_event = on_event or (lambda name, tag: None)
+        self.near_end_s = near_end_s
+        self.output = None
+        self._rate_support = {} # Frecuencia -> admitida por el dispositivo de salida
+        self._commands = collections.deque()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        # Estado exclusivo del productor
+        self._current = None   # (source, tag)
+        self._next = None      # (source, tag)
+        self._fading = None    # fuente saliente durante un fundido
+        self._fade_total = 0
+        self._fade_done = 0
+        self._cur_read = 0     # bytes leídos de la fuente actual
+        self._pending = b""
+        self._reopen = False   # La pista actual entró a otra frecuencia: reabrir al vaciarse el buffer
+        # Marcas de pista (_Segment); compartidas con los lectores
+        self._segments = collections.deque()
+        self._seg_lock = threading.Lock()
+        self._seg_seq = 0
+        self._reported_seq = None # Última marca audible ya notificada
+        self._near_end_sent = False
+
+    # --- API (cualquier hilo) ---
+    def _rate_supported(self, rate):
+        if rate not in self._rate_support:
+            try:
+                dev = self._pa.get_default_output_device_info()
+                self._rate_support[rate] = bool(self._pa.is_format_supported(
+                    rate, output_device=dev["index"], output_channels=OUTPUT_CHANNELS, output_format=pyaudio.paInt16))
+            except Exception:
+                self._rate_support[rate] = False
+        return self._rate_support[rate]
+
+    def _default_rate(self):
+        try: return int(self._pa.get_default_output_device_info()["defaultSampleRate"])
+        except Exception: return OUTPUT_RATE
+
+    def pick_rate(self, native_rate, gapless=False):
+        """Frecuencia de salida para una fuente. Nativa si el dispositivo la admite (reabriendo la
+           salida en un cambio manual); si no, o si es una transición gapless, la de la salida actual
+           y ffmpeg remuestrea en streaming.
+        """
+        current = self.output.frame_rate if self.output else None
+        if current and (gapless or native_rate == current):
+            return current
+        if native_rate and self._rate_supported(native_rate):
+            return native_rate
+        return current or (OUTPUT_RATE if self._rate_supported(OUTPUT_RATE) else self._default_rate())
+
+    def _ensure_thread(self):
+        if self._thread: return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _post(self, *cmd, wait=False):
+        self._ensure_thread()
+        done = threading.Event() if wait else None
+        self._commands.append(cmd + (done,))
+        self._wake.set()
+        # play/stop esperan a que el productor los aplique: al volver, now() ya refleja el cambio
+        if done: done.wait(1.0)
+
+    def play(self, source, tag):
+        """Sustituye inmediatamente lo que suena (descarta el buffer y cualquier 'siguiente').
+           Si no se pudo abrir la salida, relanza el error del productor (la fuente ya está cerrada)."""
+        error = [None]
+        self._post("play", source, tag, error, wait=True)
+        if error[0]: raise error[0]
+
+    def set_next(self, source, tag):
+        """Arma la siguiente pista: entra sin silencio (o con fundido) al acabar la actual."""
+        self._post("next", source, tag)
+
+    def clear_next(self):
+        self._post("clear_next")
+
+    def seek(self, seconds):
+        """Salta dentro de la pista actual: la fuente se reposiciona y el buffer se descarta."""
+        self._post("seek", seconds, wait=True)
+
+    def stop(self):
+        self._post("stop", wait=True)
+
+    def _audible(self):
+        out = self.output
+        if not out: return None
+        r = out.ring._r
+        with self._seg_lock:
+            segs = self._segments
+            while len(segs) > 1 and segs[1].mark <= r:
+                segs.popleft()
+            return segs[0] if segs else None
+
+    def now(self):
+        """Marca (_Segment) de la pista que está sonando ahora mismo, o None en silencio."""
+        seg = self._audible()
+        return seg if seg and seg.tag is not None else None
+
+    def now_tag(self):
+        seg = self.now()
+        return seg.tag if seg else None
+
+    def position_ms(self):
+        out = self.output
+        seg = self.now()
+        if not out or not seg: return 0
+        return seg.offset_ms + max(0, out.ring._r - seg.mark) * 1000.0 / (out.frame_rate * out.frame_bytes)
+
+    # --- Productor ---
+    def _open_output(self, rate):
+        """Abre (o reabre a otra frecuencia) la salida."""
+        old = self.output
+        if old and old.frame_rate == rate: return
+        if old:
+            old.close()
+        with self._seg_lock:
+            self._segments.clear() # Las marcas del ring anterior ya no significan nada
+        self.output = None
+        self.output = AudioOutput(self._pa, rate, OUTPUT_CHANNELS,
+                                  buffer_ms=self._buffer_ms, is_paused=self._is_paused)
+        logging.info(f"🔈 Salida de audio abierta a {rate} Hz")
+
+    def _mark(self, tag, duration=0, flush=False, offset_ms=0):
+        out = self.output
+        if not out: return
+        w = out.ring._w
+        with self._seg_lock:
+            if flush:
+                self._segments.clear()
+            self._seg_seq += 1
+            # Los cambios por play/seek/stop (flush) no se notifican; los del propio productor sí
+            self._segments.append(_Segment(w, tag, duration, not flush, self._seg_seq, offset_ms))
+        if flush:
+            out.request_flush(w)
+        out.idle = tag is None
+
+    def _poll_events(self):
+        seg = self._audible()
+        if not seg: return
+        if seg.seq != self._reported_seq:
+            self._reported_seq = seg.seq
+            self._near_end_sent = False
+            if seg.notify:
+                self._emit("advanced" if seg.tag is not None else "ended", seg.tag)
+        elif seg.tag is not None and seg.duration and not self._near_end_sent:
+            lead = min(self.near_end_s, seg.duration * 0.2)
+            if self.position_ms() / 1000.0 >= seg.duration - lead:
+                self._near_end_sent = True
+                self._emit("near_end", seg.tag)
+
+    def _emit(self, name, tag):
+        try: self._on_event(name, tag)
+        except Exception as e: logging.error(f"Error en evento de audio '{name}': {e}")
+
+    def _close_sources(self, *slots):
+        for slot in slots:
+            src = slot[0] if isinstance(slot, tuple) else slot
+            if src:
+                try: src.close()
+                except Exception: pass
+
+    def _apply_commands(self):
+        while self._commands:
+            cmd = self._commands.popleft()
+            op = cmd[0]
+            if op == "play":
+                self._reopen = False
+                self._close_sources(self._current, self._next, self._fading)
+                self._current, self._next, self._fading = None, None, None
+                self._cur_read = 0
+                self._pending = b""
+                try:
+                    self._open_output(cmd[1].frame_rate)
+                    self._current = (cmd[1], cmd[2])
+                    self._mark(cmd[2], cmd[1].duration, flush=True)
+                except Exception as e:
+                    logging.error(f"❌ No se pudo abrir la salida de audio: {e}")
+                    self._close_sources(cmd[1])
+                    self._mark(None, flush=True)
+                    cmd[3][0] = e # play() lo relanza: quien llamó no debe darla por sonando
+            elif op == "next":
+                self._close_sources(self._next)
+                self._next = (cmd[1], cmd[2])
+            elif op == "clear_next":
+                self._close_sources(self._next)
+                self._next = None
+            elif op == "seek" and self._current and self.output:
+                src, tag = self._current
+                if self._reopen: # Lo que quedaba de la pista anterior se descarta igualmente
+                    self._reopen = False
+                    self._open_output(src.frame_rate)
+                self._close_sources(self._fading)
+                self._fading = None
+                src.seek(cmd[1])
+                out = self.output
+                self._cur_read = int(cmd[1] * out.frame_rate) * out.frame_bytes
+                self._pending = b""
+                self._mark(tag, src.duration, flush=True, offset_ms=cmd[1] * 1000.0)
+            elif op == "stop":
+                self._reopen = False
+                self._close_sources(self._current, self._next, self._fading)
+                self._current = self._next = self._fading = None
+                self._pending = b""
+                self._mark(None, flush=True)
+            if cmd[-1]: cmd[-1].set()
+
+    def _advance(self):
+        """Fin de la fuente actual: entra la siguiente en el mismo buffer (gapless) o queda en silencio."""
+        self._close_sources(self._current)
+        self._current, self._next = self._next, None
+        self._cur_read = 0
+        if self._current:
+            out = self.output
+            if out and out.frame_rate != self._current[0].frame_rate:
+                # La salida cambió de frecuencia desde que se armó: se reabre cuando el callback vacíe
+                # el buffer, sin bloquear al productor (sigue atendiendo comandos; en pausa no se pierde nada)
+                self._reopen = True
+                out.idle = True # No llegará más audio a esta salida: vaciarse no es un underrun
+            else:
+                self._mark(self._current[1], self._current[0].duration)
+        else:
+            self._mark(None)
+
+    def _fade_remaining(self):
+        """Bytes que le quedan a la fuente actual si ya toca empezar el fundido; None si no."""
+        if not self._next or self.crossfade_ms <= 0: return None
+        src, out = self._current[0], self.output
+        if not src.duration or self._next[0].frame_rate != out.frame_rate: return None
+        xf_bytes = int(out.frame_rate * self.crossfade_ms / 1000) * out.frame_bytes
+        remaining = int(src.duration * out.frame_rate) * out.frame_bytes - self._cur_read
+        return remaining if remaining <= xf_bytes else None
+
+    def _start_fade(self, remaining):
+        self._fading = self._current[0]
+        self._fade_total = max(remaining, 1)
+        self._fade_done = 0
+        self._current, self._next = self._next, None
+        self._cur_read = 0
+        self._mark(self._current[1], self._current[0].duration)
+
+    def _mix_fade(self, incoming, nbytes):
+        outgoing = self._fading.read(nbytes)
+        if not outgoing:
+            self._close_sources(self._fading)
+            self._fading = None
+            return incoming
+        t = min(1.0, self._fade_done / self._fade_total)
+        self._fade_done += len(outgoing)
+        size = max(len(outgoing), len(incoming))
+        outgoing = audioop.mul(outgoing.ljust(size, b"\0"), OUTPUT_SAMPLE_WIDTH, 1.0 - t)
+        incoming = audioop.mul(incoming.ljust(size, b"\0"), OUTPUT_SAMPLE_WIDTH, t)
+        return audioop.add(outgoing, incoming, OUTPUT_SAMPLE_WIDTH)
+
+    def _read_chunk(self, nbytes):
+        if not self._fading:
+            remaining = self._fade_remaining()
+            if remaining is not None:
+                self._start_fade(remaining)
+        raw = self._current[0].read(nbytes)
+        self._cur_read += len(raw)
+        if self._fading:
+            return self._mix_fade(raw, nbytes)
+        if not raw:
+            self._advance()
+        return raw
+
+    def _run(self):
+        while not self._closed:
+            try:
+                self._apply_commands()
+                self._poll_events()
+                out = self.output
+                if self._reopen:
+                    if out and out.ring.fill() > 0:
+                        time.sleep(self.CHUNK_MS / 2000.0)
+                        continue
+                    self._reopen = False
+                    self._open_output(self._current[0].frame_rate)
+                    self._mark(self._current[1], self._current[0].duration)
+                    continue
+                if not self._pending:
+                    if not self._current or not out:
+                        self._wake.wait(0.1)
+                        self._wake.clear()
+                        continue
+                    chunk_bytes = int(out.frame_rate * self.CHUNK_MS / 1000) * out.frame_bytes
+                    if out.ring.free() < chunk_bytes:
+                        time.sleep(self.CHUNK_MS / 2000.0) # Buffer lleno (o en pausa): esperar al callback
+                        continue
+                    raw = self._read_chunk(chunk_bytes)
+                    if not raw or self.output is not out: continue
+                    # Apply volume (ganancia lineal ya cacheada en set_volume)
+                    self._pending = self._gain.process(raw)
+                written = out.ring.write(self._pending)
+                self._pending = self._pending[written:]
+                if self._pending:
+                    time.sleep(self.CHUNK_MS / 2000.0)
+            except Exception as e:
+                logging.error(f"❌ Error en el productor de audio: {e}")
+                self._reopen = False
+                self._close_sources(self._current, self._next, self._fading)
+                self._current = self._next = self._fading = None
+                self._pending = b""
+                self._mark(None)
+
+    def close(self):
+        self.stop()
+        self._closed = True
+        out, self.output = self.output, None
+        if out: out.close()
+
+
+def open_audio_source(filepath, config, pick_rate=None):
+    """Abre la fuente a la frecuencia que decida pick_rate(frecuencia_nativa) (nativa por defecto)."""
+    duration, native_rate = probe_audio(filepath)
+    rate = pick_rate(native_rate) if pick_rate else (native_rate or OUTPUT_RATE)
+    if config.get("stream_decode", True):
+        source = FFmpegSource(filepath, rate, duration=duration)
+    else:
+        source = SegmentSource(filepath, rate)
+    source.native_rate = native_rate or rate
+    return source
+
 # --- Utilidades de Hardware ---
 def get_input_devices():
     indices = []
@@ -340,6 +1631,8 @@ class CommandParser:
     RE_PLAYLIST = re.compile(r"^(pp|playlist|lista)(\s+(?P<q>.+))?$", re.I)
     RE_PLAYLIST_REMOVE = re.compile(r"^(pr|ppremove|playlistremove)(\s+(?P<q>.+))?$", re.I)
     RE_PLAYLISTS = re.compile(r"^(ps|playlists)$", re.I)
+    RE_PLAYLIST_CHECK_RESUME = re.compile(r"^(pcresume|pcreanudar)$", re.I)
+    RE_PLAYLIST_CHECK_FULL = re.compile(r"^(pcf|fullcheck)(\s+(?P<q>.+))?$", re.I)
     RE_PLAYLIST_CHECK = re.compile(r"^(pc|playlistcheck|playlist check|checkplaylist)(\s+(?P<q>.+))?$", re.I)
     RE_PLAYLIST_CHECK_RECOVERED = re.compile(r"^(pcr)(\s+(?P<q>.+))?$", re.I)
     RE_PLAYLIST_CHECK_DEEP = re.compile(r"^(pcd|deepcheck)(\s+(?P<q>.+))?$", re.I)
@@ -364,7 +1657,7 @@ class CommandParser:
     RE_VOL_REL = re.compile(r"(?P<op>sube|subir|baja|bajar|m[áa]s|menos)\s+(el\s+|la\s+)?(volumen|m[uú]sica|audio|alto|bajo)(?P<amount>\s+un\s+poco)?", re.I)
     RE_MUTE = re.compile(r"^(silencio|calla(te)?|cállate|mute|shh|sh|m)$", re.I)
     RE_UNMUTE = re.compile(r"(habla|unmute|devuelve (el )?sonido|sonido|audio on)", re.I)
-    RE_REPLAY = re.compile(r"(repite|repetir|otra vez|ponla de nuevo|reinicia(r)?|bise|reus)", re.I)
+    RE_REPLAY = re.compile(r"(replay|repite|repetir|otra vez|ponla de nuevo|reinicia(r)?|bise|reus)", re.I)
     RE_RADIO = re.compile(r"(encender|activar|apagar|desactivar|radio|auto-?dj|modo radio)\s*(radio|auto-?dj|modo radio)?\s*(?P<op>on|off)?", re.I)
     RE_FILTROS = re.compile(r"(activar|desactivar|quitar|poner|sin|con|apaga(r?)|enciende|encender)?\s*(los\s+)?filtros?\s*(?P<op>on|off)?", re.I)
     RE_INFO = re.compile(r"(info|informaci[oó]n|qu[eé]\s+suena|estado)", re.I)
@@ -376,12 +1669,27 @@ class CommandParser:
     RE_FILTROS_OP = re.compile(r"(?P<kw>activar|desactivar|quitar|poner|sin|con|apaga(r?)|enciende|encender)", re.I)
     RE_VOL_SHORT = re.compile(r"^(v|vol)\s+(?P<n>\d{1,3})$", re.I)
     RE_ENSURE = re.compile(r"^ensure\s+(?P<id>[a-zA-Z0-9_-]{11})$", re.I)
+    RE_SEEK_FWD = re.compile(r"^(adelanta(r)?|avanza(r)?)(\s+(?P<n>\d{1,4}))?(\s*(s|seg(undos)?))?$", re.I)
+    RE_SEEK_BACK = re.compile(r"^(atrasa(r)?|retrocede(r)?)(\s+(?P<n>\d{1,4}))?(\s*(s|seg(undos)?))?$", re.I)
+    RE_CANCEL = re.compile(r"^(cancel(ar)?|cancela)$", re.I)
+    RE_SEEK_ABS = re.compile(r"^(ir a(l)?|ve a(l)?|seek)\s+(?P<m>\d{1,3})(:(?P<s>\d{2}))?$", re.I)
 
     def parse(self, text: str):
         raw = text.strip()
         t = raw.lower()
 
         if self.RE_AYUDA.search(raw): return ("help", {})
+        if self.RE_CANCEL.search(raw): return ("cancel", {})
+
+        m = self.RE_SEEK_FWD.search(raw)
+        if m: return ("seek", {"delta": int(m.group("n") or 10)})
+        m = self.RE_SEEK_BACK.search(raw)
+        if m: return ("seek", {"delta": -int(m.group("n") or 10)})
+        m = self.RE_SEEK_ABS.search(raw)
+        if m:
+            # "ir a 1:30" -> minutos:segundos; "ir a 90" -> segundos
+            pos = int(m.group("m")) * 60 + int(m.group("s")) if m.group("s") else int(m.group("m"))
+            return ("seek", {"pos": pos})
         if self.RE_PLAYFAV.search(raw): return ("playfav", {}) # Prioridad sobre 'play'
         if self.RE_FAV_RANDOM.search(raw): return ("favrandom", {})
         m = self.RE_PLAYLIST.search(raw)
@@ -400,6 +1708,12 @@ class CommandParser:
         m = self.RE_PLAYLIST_CHECK_RECOVERED.match(t)
         if m: return "playlistcheck_recovered", m.groupdict()
 
+        m = self.RE_PLAYLIST_CHECK_RESUME.match(t)
+        if m: return "playlistcheck_resume", {}
+
+        m = self.RE_PLAYLIST_CHECK_FULL.match(t)
+        if m: return "playlistcheck_full", m.groupdict()
+
         m = self.RE_PLAYLIST_CHECK.match(t)
         if m: return "playlistcheck", m.groupdict()
         
@@ -506,6 +1820,210 @@ def on_exit_hook():
 
 atexit.register(on_exit_hook)
 
+# -----------------------------------------------------------
+# Estado compartido del reproductor
+# -----------------------------------------------------------
+# Instantánea inmutable de "lo que suena": se sustituye entera (asignación atómica),
+# así que los lectores (info, comandos, radio) nunca necesitan lock ni ven un estado a medias.
+_NowPlaying = collections.namedtuple("_NowPlaying", "info filepath duration previous_info")
+
+class PlayQueue:
+    """Cola de reproducción con su propio lock, independiente del estado de reproducción.
+       Elementos: (info, filepath) con filepath=None si aún no está descargado.
+       Todas las operaciones son O(1) o un recorrido breve bajo el lock; nada de red ni disco.
+    """
+    def __init__(self, on_change=None):
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._on_change = on_change or (lambda: None) # Avisa al hidratador de metadatos
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return len(self._items) > 0
+
+    def append(self, item):
+        with self._lock:
+            self._items.append(item)
+        self._on_change()
+
+    def extend(self, items):
+        with self._lock:
+            self._items.extend(items)
+        self._on_change()
+
+    def peek(self):
+        with self._lock:
+            return self._items[0] if self._items else None
+
+    def pop_front(self):
+        with self._lock:
+            item = self._items.popleft() if self._items else None
+        self._on_change()
+        return item
+
+    def pop_front_if(self, video_id):
+        """Quita el primero solo si es video_id (p.ej. porque ya se consumió como precarga)."""
+        with self._lock:
+            item = self._items.popleft() if self._items and self._items[0][0]["id"] == video_id else None
+        if item: self._on_change()
+        return item
+
+    def unresolved(self, window):
+        """Infos sin URL resuelta ni intento previo entre los primeros 'window' elementos (los que sonarán pronto)."""
+        with self._lock:
+            head = [self._items[i][0] for i in range(min(window, len(self._items)))]
+        return [info for info in head if not (info.get("url") or info.get("page_url") or info.get("_hydrate_tried"))]
+
+    def first_pending(self):
+        """Primer elemento sin descargar: (índice, info) o (None, None)."""
+        with self._lock:
+            for i, (info, fpath) in enumerate(self._items):
+                if not fpath:
+                    return i, info
+        return None, None
+
+    def replace_if(self, index, video_id, item):
+        """Sustituye la posición index solo si sigue siendo video_id (la cola pudo cambiar entretanto)."""
+        with self._lock:
+            if index < len(self._items) and self._items[index][0]["id"] == video_id:
+                self._items[index] = item
+                return True
+        return False
+
+    def shuffle(self):
+        with self._lock:
+            items = list(self._items)
+            random.shuffle(items)
+            self._items = collections.deque(items)
+        self._on_change()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._items)
+
+
+# --- Índice de títulos casi duplicados ---
+# Ruido habitual en títulos de YouTube que no distingue una canción de otra
+_TITLE_NOISE_RE = re.compile(r"[\(\[][^\)\]]*(official|oficial|video|v[ií]deo|audio|lyrics?|letra|hd|4k|remaster(ed)?|visualizer)[^\)\]]*[\)\]]", re.I)
+
+def normalize_title(title, drop=None):
+    """Minúsculas, sin tildes, sin '(Official Video)' y similares, solo letras/números."""
+    t = unicodedata.normalize("NFKD", (title or "").lower())
+    t = "".join(c for c in t if not unicodedata.combining(c))
+    if drop: t = t.replace(drop.lower(), " ")
+    t = _TITLE_NOISE_RE.sub(" ", t)
+    return " ".join(re.sub(r"[^\w]+", " ", t).split())
+
+def title_shingles(norm):
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def shingle_similarity(a, b):
+    """Jaccard de trigramas de caracteres."""
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+class TitleIndex:
+    """Títulos recientes indexados por MinHash + LSH sobre trigramas de caracteres.
+       Consultar si un título es casi un duplicado de cualquiera de los últimos 'window' cuesta lo
+       mismo con 15 que con 500 entradas: firma del candidato, unas pocas cubetas y Jaccard exacto
+       solo contra los que comparten cubeta.
+    """
+    BANDS, ROWS = 16, 2 # 32 funciones hash; similitud 0.5 -> candidato con prob. ~0.99
+    _MASK = (1 << 64) - 1
+
+    def __init__(self, window=300, threshold=0.7):
+        self.window = window
+        self.threshold = threshold
+        rng = random.Random(0x5EED)
+        self._seeds = [rng.getrandbits(64) for _ in range(self.BANDS * self.ROWS)]
+        self._entries = collections.deque() # (eid, título, trigramas, claves de banda)
+        self._buckets = collections.defaultdict(set) # clave de banda -> eids
+        self._by_id = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _band_keys(self, shingles):
+        hashes = [hash(sh) & self._MASK for sh in shingles]
+        sig = [min(((h ^ seed) * 0x9E3779B97F4A7C15) & self._MASK for h in hashes) for seed in self._seeds]
+        return [(b,) + tuple(sig[b * self.ROWS:(b + 1) * self.ROWS]) for b in range(self.BANDS)]
+
+    def add(self, title, drop=None):
+        shingles = title_shingles(normalize_title(title, drop))
+        if not shingles: return
+        keys = self._band_keys(shingles)
+        with self._lock:
+            eid, self._next_id = self._next_id, self._next_id + 1
+            entry = (eid, title, shingles, keys)
+            self._entries.append(entry)
+            self._by_id[eid] = entry
+            for k in keys: self._buckets[k].add(eid)
+            while len(self._entries) > self.window:
+                old_id, _, _, old_keys = self._entries.popleft()
+                del self._by_id[old_id]
+                for k in old_keys:
+                    bucket = self._buckets[k]
+                    bucket.discard(old_id)
+                    if not bucket: del self._buckets[k]
+
+    def find(self, title, drop=None):
+        """(título reciente más parecido, similitud) si supera el umbral; (None, mejor similitud) si no."""
+        shingles = title_shingles(normalize_title(title, drop))
+        if not shingles: return None, 0.0
+        keys = self._band_keys(shingles)
+        with self._lock:
+            cands = set().union(*(self._buckets.get(k, ()) for k in keys))
+            scored = [(shingle_similarity(shingles, self._by_id[c][2]), self._by_id[c][1]) for c in cands]
+        best = max(scored, default=(0.0, None))
+        return (best[1], best[0]) if best[0] >= self.threshold else (None, best[0])
+
+
+class RadioPool:
+    """Reserva acotada de candidatos de radio ya filtrados (solo metadatos, sin descargar)."""
+    def __init__(self):
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, infos, size, front=False):
+        """Añade los que no estén ya; front=True los pone delante (más relevantes). Devuelve cuántos."""
+        with self._lock:
+            present = {i["id"] for i in self._items}
+            fresh = [i for i in infos if i["id"] not in present]
+            if front:
+                self._items.extendleft(reversed(fresh))
+            else:
+                fresh = fresh[:max(0, size - len(self._items))]
+                self._items.extend(fresh)
+            while len(self._items) > size:
+                self._items.pop()
+            return len(fresh)
+
+    def peek(self, accept):
+        """El candidato que devolvería take(accept), sin sacarlo de la reserva."""
+        with self._lock:
+            return next((i for i in self._items if accept(i)), None)
+
+    def take(self, accept):
+        """Primer candidato que siga siendo válido (los caducados se descartan)."""
+        with self._lock:
+            while self._items:
+                info = self._items.popleft()
+                if accept(info): return info
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
 # -----------------------------------------------------------
 # Reproductor basado en Pydub + PyAudio
 # -----------------------------------------------------------
@@ -513,27 +2031,32 @@ class AudioPlayer:
     def __init__(self, radio_enabled: bool = True):
         # Audio Engine (pydub + pyaudio)
         self._pa = pyaudio.PyAudio()
-        self._stream = None
-        self._audio_segment = None
-        self._playback_thread = None
-        self._playback_active = False
-        self._pts_ms = 0
-        self._session_id = 0
         
         self._last_query = None
         self._last_index = 0
         self._paused = False
-        self._current_title = None
-        self._current_id = None
-        self._current_info = None
-        self._current_filepath = None
-        self._current_duration = 0
+        self._now = _NowPlaying(None, None, 0, None)
         self.history = []
-        self._previous_info = None
         self.radio_mode = radio_enabled 
         self._manually_stopped = True
         self.config = load_config()
+        # Historial largo para evitar repeticiones (el de 'history' sigue mostrando los 15 últimos)
+        self._recent = TitleIndex(self.config.get("history_window", 300), self.config.get("similarity_threshold", 0.7))
+        AUDIO_CACHE.set_budget(self.config.get("audio_cache_mb", 1024))
+        METADATA.set_ttl(self.config.get("metadata_ttl_hours", 24),
+                         self.config.get("recs_ttl_hours", 12), self.config.get("recs_cache_max", 500))
         self._volume = self.config.get("volume", 0.02)
+        self._gain = GainStage(self._volume)
+        # Un único stream de salida para toda la sesión (gapless / crossfade)
+        # Los eventos del motor (near_end/advanced/ended) se atienden en su propio hilo
+        self._events = queue_mod.Queue()
+        self._engine = PlaybackEngine(
+            self._pa, self._gain,
+            buffer_ms=self.config.get("output_buffer_ms", 300),
+            crossfade_ms=self.config.get("crossfade_ms", 0),
+            is_paused=lambda: self._paused,
+            on_event=lambda name, tag: self._events.put((name, tag))
+        )
         
         logging.info(f"🔊 Volumen inicial cargado: {int(self._volume * 1000)}%")
         self.forced_keyword = self.config.get("forced_keyword")
@@ -546,26 +2069,82 @@ class AudioPlayer:
         
         self._preloaded_data = None
         self._preloading = False
-        self.queue = []
+        self._armed_next = None # (info, fpath) ya entregado al motor como siguiente pista
+        self._predecoded = {} # fpath -> fuente ya abierta y cebada en segundo plano
+        self._jobs = [] # Tareas en segundo plano en curso (Job)
+        self._jobs_lock = threading.Lock()
+        self._hydrate_wake = threading.Event()
+        self.queue = PlayQueue(on_change=self._hydrate_wake.set)
+        AUDIO_CACHE.set_in_use(self._cache_paths_in_use)
+        self._radio_pool = RadioPool()
+        self._radio_prefetch = None # (id, fpath): cabeza de la reserva ya descargada por el recolector
+        self._harvest_wake = threading.Event()
+        # Modelo de locks:
+        #  - self._now: instantánea inmutable, se cambia por asignación (sin lock).
+        #  - self.queue: lock propio y corto.
+        #  - self._lock: solo la contabilidad de precarga (_preloaded_data, _armed_next, _predecoded...).
+        #  - self._transition_lock: serializa los cambios de pista; nunca lo toca el audio.
+        # El callback de PyAudio y el productor del motor no toman ninguno de ellos.
         self._lock = threading.RLock()
+        self._transition_lock = threading.RLock()
         
         # Radio exhaustion prevention
         self._radio_exhausted = False
-        self._last_radio_attempt = 0
-
-    def _get_db_gain(self, vol_float):
-        """Map 0.0-1.0 float to dB gain for pydub. 
-           We assume 0.1 (default-ish) is a normal reference.
-        """
-        if vol_float <= 0: return -120 # Mute
-        # Using a reference where 0.1 is roughly 0dB or similar?
-        # Let's say 1.0 is 0dB (max volume without clipping)
-        import math
-        return 20 * math.log10(vol_float)
-
+        self._retry_timer = None
+        self._advance_pending = False # Acabó la pista mientras la precarga seguía en curso
+        self._track_seq = 0 # Sube en cada cambio de pista o stop (bajo _transition_lock)
+
+        threading.Thread(target=self._event_loop, daemon=True).start()
+        threading.Thread(target=self._hydrate_loop, daemon=True).start()
+        threading.Thread(target=self._harvest_loop, daemon=True).start()
+        if self.radio_mode: self._harvest_wake.set()
+
+    # Tareas de las que solo tiene sentido una a la vez: la más nueva cancela a las anteriores
+    EXCLUSIVE_JOBS = {"play"}
+    # Tareas de un solo hueco: mientras una corre no se admite otra (leen y escriben playlists.json)
+    SINGLE_SLOT_JOBS = {"import"}
+
+    def _submit_job(self, kind, label, fn):
+        """Lanza fn(job) en segundo plano y devuelve el control al prompt/voz al instante."""
+        job = Job(kind, label)
+        with self._jobs_lock:
+            if kind in self.SINGLE_SLOT_JOBS:
+                busy = next((j for j in self._jobs if j.kind == kind and not j.cancelled), None)
+                if busy:
+                    logging.warning(f"⚠️ Ya hay una tarea en curso ({busy.label}: {busy.status}); espera a que termine o 'cancelar'")
+                    return None
+            if kind in self.EXCLUSIVE_JOBS:
+                for old in self._jobs:
+                    if old.kind == kind and not old.cancelled:
+                        old.cancel()
+                        logging.info(f"⛔ Cancelada: {old.label}")
+            self._jobs.append(job)
+
+        def run():
+            try:
+                fn(job)
+            except JobCancelled:
+                logging.info(f"⛔ Tarea cancelada: {job.label}")
+            except Exception as e:
+                import traceback
+                logging.error(f"❌ Error en tarea '{job.label}': {e}")
+                traceback.print_exc()
+            finally:
+                with self._jobs_lock:
+                    self._jobs.remove(job)
+        threading.Thread(target=run, daemon=True).start()
+        return job
+
+    def cancel_jobs(self, kind=None):
+        with self._jobs_lock:
+            targets = [j for j in self._jobs if (kind is None or j.kind == kind) and not j.cancelled]
+        for job in targets:
+            job.cancel()
+        return len(targets)
 
     def toggle_radio(self, enabled: bool):
         self.radio_mode = enabled
+        if enabled: self._harvest_wake.set()
         logging.info(f"📻 Radio {'activada' if enabled else 'desactivada'}")
 
     def toggle_filtros(self, enabled: bool | str):
@@ -584,143 +2163,189 @@ class AudioPlayer:
         save_config(self.config)
         return self.forced_keyword
 
-    def _chunk_playback_loop(self, session_id):
-        chunk_ms = 50
-        pos_ms = 0
-        
-        # Copias locales de los objetos para evitar colisiones entre hilos
-        with self._lock:
-            seg = self._audio_segment
-            stream = self._stream
-            
-        while self._playback_active and self._session_id == session_id:
-            if self._paused:
-                time.sleep(0.1)
-                continue
-            
-            with self._lock:
-                if not seg or self._manually_stopped:
-                    break
-                
-                # Get next chunk
-                chunk = seg[pos_ms : pos_ms + chunk_ms]
-                if len(chunk) == 0:
-                    break # End of track
-                
-                # Apply volume
-                current_vol = self._volume
-                gain = self._get_db_gain(current_vol)
-                
-            # Fuera del lock para no bloquear otros hilos durante el procesado/escritura
-            chunk = chunk + gain
-            data = chunk.raw_data
-            
-            # Final check before write to minimize race with session change
-            if self._session_id != session_id or self._manually_stopped:
-                break
+    @property
+    def _pts_ms(self):
+        return self._engine.position_ms()
 
-            try:
-                if stream:
-                    # stream.write es bloqueante y dura lo que el buffer (~50ms)
-                    stream.write(data)
-            except Exception as e:
-                    # Si el error es -9983 (Stream is stopped), suele ser por una parada rápida/cambio de canción.
-                    # No es perjudicial, pero lo logueamos como INFO para no ensuciar como ERROR si es lo esperado.
-                logging.info(f"DEBUG: Stream write stopped (session {session_id}): {e}")
-                break
-            
-            with self._lock:
-                pos_ms += chunk_ms
-                self._pts_ms = pos_ms
-        
-        # Cleanup when loop ends
-        with self._lock:
-            # Solo limpiar si seguimos en la misma sesión que inició este hilo
-            if self._session_id == session_id:
-                self._playback_active = False
-                if self._stream:
-                    try:
-                        self._stream.stop_stream()
-                        self._stream.close()
-                    except: pass
-                    self._stream = None
+    @property
+    def _playback_active(self):
+        return self._engine.now_tag() is not None
 
-    def _start_playback(self, info, filepath):
-        """Inicia el reproductor y elimina el archivo anterior."""
-        with self._lock:
-            old_path = self._current_filepath
-            self.stop_locked()
-            
-            # Limpieza agresiva: borrar anterior
-            if old_path and os.path.exists(old_path) and old_path != filepath:
-                try: 
-                    os.remove(old_path)
-                except: pass
-            
+    @property
+    def _current_info(self):
+        return self._now.info
+
+    @property
+    def _current_title(self):
+        return self._now.info["title"] if self._now.info else None
+
+    @property
+    def _current_id(self):
+        return self._now.info["id"] if self._now.info else None
+
+    @property
+    def _current_filepath(self):
+        return self._now.filepath
+
+    @property
+    def _current_duration(self):
+        return self._now.duration
+
+    @property
+    def _previous_info(self):
+        return self._now.previous_info
+
+    def _start_playback(self, info, filepath, job=None):
+        """Inicia el reproductor y elimina el archivo anterior. Con 'job', si se canceló
+           (otro 'pon', 'stop'...) antes de tomar el lock de transición, no suena."""
+        # Abrir la fuente FUERA del lock (o reutilizar la ya predecodificada en segundo plano)
+        try:
+            logging.info(f"⏳ Cargando audio: {info['title']}...")
+            source = self._take_source(filepath)
+        except Exception as e:
+            logging.error(f"❌ Error abriendo audio: {e}")
+            return None
+
+        with self._transition_lock:
+            if job and job.cancelled:
+                source.close()
+                job.check()
             try:
-                # Load Audio
-                logging.info(f"⏳ Cargando audio: {info['title']}...")
-                seg = AudioSegment.from_file(filepath)
-                # Normalize to standard format for easier output
-                seg = seg.set_frame_rate(44100).set_channels(2).set_sample_width(2)
-                self._audio_segment = seg
-                
-                # Setup Stream
-                self._stream = self._pa.open(
-                    format=self._pa.get_format_from_width(seg.sample_width),
-                    channels=seg.channels,
-                    rate=seg.frame_rate,
-                    output=True
-                )
-                
-                self._session_id += 1
-                session_id = self._session_id
-                self._playback_active = True
-                self._pts_ms = 0
-                self._playback_thread = threading.Thread(target=self._chunk_playback_loop, args=(session_id,), daemon=True)
-                self._playback_thread.start()
-
-                self._previous_info = self._current_info
-                self._current_filepath = filepath
+                # El stream persistente cambia de fuente sin cerrarse
+                self._engine.play(source, filepath)
+                with self._lock:
+                    self._armed_next = None
                 self._paused = False
-                self._current_title = info["title"]
-                self._current_id = info["id"]
-                self._current_info = info
-                self._current_duration = len(seg) / 1000.0
-                
-                self.history.append(info["title"])
-                if len(self.history) > 15:
-                    self.history.pop(0)
-                
-                self._manually_stopped = False
-                logging.info(f"▶️ Reproduciendo: {info['title']}")
-                
-                self._preloaded_data = None
-                self._preloading = False
-                
-                if not info.get("_is_plist", False):
-                    self.plist_mode = False
-                
+                self._set_now_playing(info, filepath, source.duration)
                 return info
             except Exception as e:
                 import traceback
                 logging.error(f"❌ Error playback: {e}")
                 traceback.print_exc()
+                source.close()
                 return None
 
+    def _cache_paths_in_use(self):
+        """Audios que la caché no puede expulsar: sonando, precargado, armado y los ya descargados de la cola.
+           Lecturas sin lock (asignaciones atómicas); la cola usa su propio lock corto."""
+        paths = [self._current_filepath]
+        for slot in (self._preloaded_data, self._armed_next, self._radio_prefetch):
+            if slot: paths.append(slot[1])
+        paths += [fpath for _, fpath in self.queue.snapshot() if fpath]
+        return paths
+
+    def _set_now_playing(self, info, filepath, duration=0):
+        """Actualiza el estado de 'sonando ahora' (cambio manual o transición gapless del motor)."""
+        old = self._now
+        self._now = _NowPlaying(info, filepath, duration or info.get("duration") or 0, old.info)
+        self._track_seq += 1
+        
+        self.history.append(info["title"])
+        if len(self.history) > 15:
+            self.history.pop(0)
+        self._recent.add(info["title"], self.forced_keyword)
+        
+        self._manually_stopped = False
+        logging.info(f"▶️ Reproduciendo: {info['title']}")
+        
+        with self._lock:
+            self._preloaded_data = None
+            self._preloading = False
+        self._discard_predecoded()
+        
+        if not info.get("_is_plist", False):
+            self.plist_mode = False
+        self._harvest_wake.set() # Nuevo tema: sus recomendaciones pasan al frente de la reserva de radio
+
+        # Limpieza agresiva: borrar anterior (salvo si vive en la caché de audio)
+        if old.filepath and os.path.exists(old.filepath) and old.filepath != filepath and not AUDIO_CACHE.owns(old.filepath):
+            try: 
+                os.remove(old.filepath)
+            except: pass
 
-    def play_query(self, query: str, index: int = 0):
-        # logging.info(f"DEBUG: play_query called with query='{query}', index={index}")
-        self.plist_mode = False # Reset playlist
-        self._last_query = query
-        self._last_index = index
+    def _take_preloaded(self):
+        """Consume la precarga (y la quita del tope de la cola si venía de ahí)."""
+        with self._lock:
+            info, fpath = self._preloaded_data
+            self._preloaded_data = None
+        self.queue.pop_front_if(info["id"])
+        self._radio_exhausted = False  # Resetear si encontramos contenido
+        return info, fpath
+
+    def _predecode(self, fpath):
+        """Abre y ceba el decodificador de la pista precargada en segundo plano (fuera del lock)."""
+        try:
+            source = self._open_source(fpath, gapless=True)
+            source.prime(self.config.get("predecode_seconds", 2))
+        except Exception as e:
+            logging.warning(f"⚠️ No se pudo predecodificar la siguiente pista: {e}")
+            return
+        with self._lock:
+            if self._preloaded_data and self._preloaded_data[1] == fpath and fpath not in self._predecoded:
+                self._predecoded[fpath] = source
+                logging.info(f"🎛️ Siguiente pista predecodificada: {self._preloaded_data[0]['title']}")
+                # Armarla ya en el motor: entrará sola y sin hueco al acabar la actual
+                if self._playback_active and not self._armed_next:
+                    self._arm_preloaded()
+                return
+        source.close() # La precarga cambió mientras tanto
+
+    def _take_source(self, fpath):
+        with self._lock:
+            source = self._predecoded.pop(fpath, None)
+        return source or self._open_source(fpath)
+
+    def _open_source(self, fpath, gapless=False):
+        """Abre la fuente a la frecuencia de salida elegida por el motor y contabiliza el remuestreo."""
+        source = open_audio_source(fpath, self.config, pick_rate=lambda native: self._engine.pick_rate(native, gapless))
+        if source.native_rate == source.frame_rate:
+            DECODE_STATS.opened("native")
+            logging.info(f"🎚️ Audio a {source.frame_rate} Hz nativos (sin remuestreo)")
+        else:
+            DECODE_STATS.opened("resampled")
+            logging.info(f"🔁 Remuestreo en streaming: {source.native_rate} Hz -> {source.frame_rate} Hz")
+        return source
+
+    def _discard_predecoded(self):
+        with self._lock:
+            sources, self._predecoded = list(self._predecoded.values()), {}
+        for source in sources:
+            source.close()
 
+    def _arm_preloaded(self):
+        """Entrega la precarga al motor como siguiente pista: entrará sin hueco al acabar la actual."""
+        info, fpath = self._preloaded_data
+        try:
+            source = self._take_source(fpath)
+        except Exception as e:
+            logging.error(f"❌ Error preparando la siguiente pista: {e}")
+            return
+        self._engine.set_next(source, fpath)
+        self._armed_next = (info, fpath)
+
+    def _disarm_next(self):
+        if self._armed_next:
+            self._engine.clear_next()
+            self._armed_next = None
+
+
+    def play_query(self, query: str, index: int = 0, job=None):
+        # logging.info(f"DEBUG: play_query called with query='{query}', index={index}")
+        if job: job.progress("Buscando...")
 
         # Buscamos un resultado que pase los filtros
         info = None
+        spec = None
         for i in range(10):
+            if job: job.check()
             candidate = get_search_info(query, index=index + i)
             if not candidate: break
+            if (spec is None and candidate.get("id") != self._current_id
+                    and candidate.get("_type", "video") in ("video", "url", "url_transparent")
+                    and is_content_allowed(candidate, self.config)):
+                # El primer resultado que pasa los filtros baratos (tipo, duración, lista negra) casi siempre
+                # es el elegido: su descarga arranca ya, en paralelo al resto de comprobaciones
+                spec = self._speculate_download(candidate, job)
             
             c_title = candidate.get("title", "Sin título")
             
@@ -742,21 +2367,62 @@ class AudioPlayer:
             else:
                 logging.info(f"⏳ Saltando por filtros: {c_title}")
 
+        if spec and spec[0] is not info:
+            self._abandon_speculation(spec) # Candidato descartado por los filtros
+
         if not info:
             logging.warning(f"⚠️ No se encontraron resultados para '{query}' que pasen los filtros.")
             # Si no hay resultados con filtros, intentamos mostrar qué se encontró aunque se saltara
             return None
         
-        logging.info(f"💾 Descargando: {info.get('title')}...")
-        filepath = download_media(info.get("page_url") or info.get("url"), prefix=TEMP_AUDIO_PREFIX)
+        if spec and spec[0] is info:
+            filepath = spec[2].result() # La descarga ya iba adelantada
+            if job: job.check()
+        else:
+            if job: job.progress(f"Descargando: {info.get('title')}")
+            else: logging.info(f"💾 Descargando: {info.get('title')}...")
+            filepath = download_media(info.get("page_url") or info.get("url"), prefix=TEMP_AUDIO_PREFIX, video_id=info.get("id"), job=job)
         if not filepath: return None
 
+        if job: job.progress(f"Cargando: {info.get('title')}")
+        # El estado solo cambia al final: una petición cancelada no toca playlist/radio
+        self.plist_mode = False # Reset playlist
+        self._last_query = query
+        self._last_index = index
         # Resetear bandera de radio exhausta al reproducir nueva canción manualmente
         self._radio_exhausted = False
-        return self._start_playback(info, filepath)
+        return self._start_playback(info, filepath, job=job)
+
+    def _speculate_download(self, info, parent=None):
+        """Empieza a descargar 'info' antes de saber si pasará los filtros. Devuelve (info, job, futuro)."""
+        spec_job = Job("spec", parent.label if parent else "pon", parent=parent)
+        fut = concurrent.futures.Future()
+        def run():
+            try:
+                fut.set_result(download_media(info.get("page_url") or info.get("url"), prefix=TEMP_AUDIO_PREFIX, video_id=info.get("id"), job=spec_job))
+            except JobCancelled:
+                fut.set_result(None)
+            except Exception as e:
+                fut.set_exception(e)
+        logging.info(f"💾 Descargando (anticipado): {info.get('title')}...")
+        threading.Thread(target=run, daemon=True).start()
+        return info, spec_job, fut
+
+    def _abandon_speculation(self, spec):
+        info, spec_job, fut = spec
+        spec_job.cancel()
+        logging.info(f"🗑️ Descarga anticipada descartada: {info.get('title')}")
+        def discard(f):
+            # Si llegó a terminar fuera de la caché, no dejar el archivo huérfano
+            path = None if f.exception() else f.result()
+            if path and not AUDIO_CACHE.owns(path):
+                try: os.remove(path)
+                except OSError: pass
+        fut.add_done_callback(discard)
 
     def _is_too_similar(self, title1, title2, threshold=0.85):
-        if not title1 or not title2: return False
+        """Criterio de 'play': ¿es casi lo mismo que lo que suena? (difflib, como siempre)."""
+        if not title1 or not title2: return False, 0.0
         t1, t2 = title1.lower(), title2.lower()
         if self.forced_keyword:
             fk = self.forced_keyword.lower()
@@ -765,34 +2431,96 @@ class AudioPlayer:
         ratio = difflib.SequenceMatcher(None, t1, t2).ratio()
         return ratio > threshold, ratio
 
-    def update(self):
-        try:
+    def _title_similarity(self, title1, title2):
+        """Parecido de dos títulos con la misma métrica que el historial (trigramas normalizados)."""
+        if not title1 or not title2: return 0.0
+        fk = self.forced_keyword
+        return shingle_similarity(title_shingles(normalize_title(title1, fk)), title_shingles(normalize_title(title2, fk)))
+
+    def _is_recent_duplicate(self, title):
+        """¿Casi igual a algo de los últimos 'history_window' temas (incluido el actual)? Coste constante."""
+        match, _ = self._recent.find(title, self.forced_keyword)
+        return match is not None
+
+    def _event_loop(self):
+        """Atiende los eventos del motor de audio: sustituye al antiguo sondeo cada 0.5 s."""
+        handlers = {"near_end": self._on_near_end, "advanced": self._on_advanced, "ended": self._on_ended}
+        while True:
+            name, tag = self._events.get()
+            try:
+                handlers[name](tag)
+            except Exception as e:
+                import traceback
+                logging.error(f"Error atendiendo evento '{name}': {e}")
+                traceback.print_exc()
+
+    def _on_near_end(self, tag):
+        with self._lock:
+            if self._manually_stopped or tag != self._current_filepath: return
+            if self._preloaded_data:
+                if not self._armed_next and self._preloaded_data[1] in self._predecoded:
+                    self._arm_preloaded()
+            elif not self._preloading:
+                self._preloading = True
+                threading.Thread(target=self._background_preload, daemon=True).start()
+
+    def _on_advanced(self, tag):
+        # Transición gapless: el motor ya ha entrado en la pista armada
+        with self._transition_lock:
             with self._lock:
-                if self._paused or self._manually_stopped: return
-                
-                pts = self._pts_ms / 1000.0
-                duration = self._current_duration or 0
-                
-                # Track finished detection
-                finished = (pts >= duration - 0.1) and (not self._playback_active or pts > 0)
-                
-                if duration > 0 and not finished:
-                    rem = duration - pts
-                    if not self._preloaded_data and not self._preloading and (pts > duration * 0.8 or rem < 20):
-                        self._preloading = True
-                        threading.Thread(target=self._background_preload, daemon=True).start()
-
-                if finished:
-                    if self._preloaded_data:
-                        info, fpath = self._preloaded_data
-                        self._preloaded_data = None
-                        self._radio_exhausted = False
-                        self._start_playback(info, fpath)
-                    elif time.time() - getattr(self, '_last_next_call', 0) > 2:
-                        self._last_next_call = time.time()
-                        self.next_result()
-        except Exception as e:
-            logging.error(f"Error update: {e}")
+                armed = self._armed_next
+                if not armed or armed[1] != tag: return
+                self._armed_next = None
+                take = self._preloaded_data and self._preloaded_data[1] == tag
+            if take:
+                self._take_preloaded()
+            seg = self._engine.now()
+            self._set_now_playing(armed[0], armed[1], seg.duration if seg else 0)
+
+    def _on_ended(self, tag=None):
+        with self._transition_lock:
+            if self._manually_stopped or self._playback_active: return
+            with self._lock:
+                preloaded = self._preloaded_data is not None
+                if not preloaded and self._preloading:
+                    # La precarga en curso relanzará la transición al terminar
+                    self._advance_pending = True
+                    return
+            if preloaded:
+                info, fpath = self._take_preloaded()
+                self._start_playback(info, fpath)
+                return
+            seq = self._track_seq
+        self.next_result(seq)
+        if self._radio_exhausted and not self._manually_stopped:
+            self._schedule_retry(30)
+
+    def _hydrate_loop(self):
+        """Resuelve en segundo plano, por lotes, los metadatos (URL, duración...) de las canciones
+           de la cola que sonarán pronto, para que la transición no espere a una búsqueda."""
+        batch = self.config.get("hydrate_batch", 4)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=batch) as ex:
+            while True:
+                self._hydrate_wake.wait()
+                self._hydrate_wake.clear()
+                window = self.config.get("hydrate_lookahead", 10)
+                pending = self.queue.unresolved(window)
+                while pending:
+                    chunk = pending[:batch]
+                    for info, full in zip(chunk, ex.map(lambda i: get_search_info(i["id"]), chunk)):
+                        # Un solo intento por canción, salga como salga: si falla, no devuelve URL o
+                        # devuelve otro vídeo, se resuelve JIT como antes en vez de reintentarla sin pausa
+                        info["_hydrate_tried"] = True
+                        if full and full.get("id") == info["id"]:
+                            info.update(full)
+                    logging.debug(f"🧩 Metadatos listos para {len(chunk)} canciones de la cola")
+                    pending = self.queue.unresolved(window)
+
+    def _schedule_retry(self, delay):
+        if self._retry_timer: self._retry_timer.cancel()
+        self._retry_timer = threading.Timer(delay, lambda: self._events.put(("ended", None)))
+        self._retry_timer.daemon = True
+        self._retry_timer.start()
 
 
     def _background_preload(self):
@@ -800,28 +2528,32 @@ class AudioPlayer:
             logging.info("⏳ Iniciando precarga JIT...")
             
             # 1. Prioridad: Siguiente en la cola (sin descargar)
-            target_info = None
-            with self._lock:
-                if self.queue:
-                    for i, item in enumerate(self.queue):
-                        info, fpath = item
-                        if not fpath:
-                            target_info = info
-                            target_index = i
-                            break
+            head = self.queue.peek()
+            ready_fpath = head[1] if head else None
+            if ready_fpath:
+                # El siguiente ya está descargado: solo falta decodificarlo
+                with self._lock:
+                    self._preloaded_data = head
+                target_index, target_info = None, None
+            else:
+                target_index, target_info = self.queue.first_pending()
             
+            if ready_fpath:
+                self._predecode(ready_fpath)
+                return
+
             if target_info:
                 logging.info(f"⏳ Precargando siguiente canción de la cola: {target_info['title']}")
                 # Descarga FUERA del lock
-                new_fpath = download_media(target_info.get("page_url") or target_info.get("url"), prefix=TEMP_AUDIO_PREFIX)
+                new_fpath = download_media(target_info.get("page_url") or target_info.get("url"), prefix=TEMP_AUDIO_PREFIX, video_id=target_info.get("id"))
                 if new_fpath:
-                    with self._lock:
-                        # Re-verificar que el item sigue en la misma posición (o existe)
-                        if len(self.queue) > target_index and self.queue[target_index][0]["id"] == target_info["id"]:
-                            self.queue[target_index] = (target_info, new_fpath)
-                            if target_index == 0:
-                                self._preloaded_data = (target_info, new_fpath)
+                    # Re-verificar que el item sigue en la misma posición (la cola pudo cambiar)
+                    if self.queue.replace_if(target_index, target_info["id"], (target_info, new_fpath)) and target_index == 0:
+                        with self._lock:
+                            self._preloaded_data = (target_info, new_fpath)
                     logging.info(f"✅ Precarga de cola lista: {target_info['title']}")
+                    # Decodificar también en segundo plano: la transición no espera a ffmpeg
+                    self._predecode(new_fpath)
                     return
 
             # 2. Si no hay cola o todo está listo, radio/recs
@@ -831,6 +2563,7 @@ class AudioPlayer:
                 with self._lock:
                     self._preloaded_data = res
                 logging.info(f"📦 Canción precargada (Radio): {res[0]['title']}")
+                self._predecode(res[1])
             else:
                 logging.info("DEBUG: Precarga finalizó sin candidato.")
         except (Exception, BaseException) as e:
@@ -839,16 +2572,137 @@ class AudioPlayer:
             traceback.print_exc()
         finally:
             self._preloading = False
+            if self._advance_pending:
+                self._advance_pending = False
+                self._events.put(("ended", None))
+
+
+    def _radio_sources(self):
+        """Fuentes de la radio por prioridad: (tipo, mensaje, función que trae la página, shuffle)."""
+        if self._current_id:
+            cur = self._current_id
+            yield "recs", f"📋 Evaluando recomendaciones para {cur}...", lambda: get_recommendations(cur), False
+        if self._last_query:
+            q, idx = self._last_query, self._last_index
+            yield "query", f"📋 Buscando en resultados de '{q}'...", lambda: get_search_entries(q)[idx + 1:], False
+        favs = load_favorites()
+        if favs:
+            yield "favs", "🎲 Buscando favorito aleatorio...", lambda: random.sample(favs, len(favs)), True
+        if self._current_title:
+            artist = self._current_title.split('-')[0].split('(')[0].strip()
+            if len(artist) > 3:
+                yield "artist", f"🔍 Buscando más de '{artist}'...", lambda: get_search_entries(artist), False
+
+    def _radio_still_valid(self, info):
+        # Lo que pudo cambiar desde que se recolectó: lo que suena, lo ya precargado y el historial
+        preloaded = self._preloaded_data
+        if preloaded and preloaded[0].get("id") == info["id"]: return False
+        return info["id"] != self._current_id and not self._is_recent_duplicate(info["title"])
+
+    def _radio_feeding(self):
+        """¿Es la radio la que decide lo siguiente? No mientras haya cola o suene una playlist."""
+        return self.radio_mode and not self.plist_mode and not self.queue
+
+    def _harvest_loop(self):
+        """Mantiene llena la reserva de candidatos de radio ya filtrados, fuera de las transiciones.
+           Con cada tema nuevo, sus recomendaciones pasan al frente de la reserva y la cabeza
+           se descarga por adelantado. Solo trabaja mientras la radio alimenta la reproducción."""
+        seeded = None
+        while True:
+            self._harvest_wake.wait(timeout=60)
+            self._harvest_wake.clear()
+            if not self._radio_feeding(): continue
+            size = self.config.get("radio_pool_size", 8)
+            try:
+                for kind, _, fetch, shuffle in self._radio_sources():
+                    is_recs = kind == "recs"
+                    if is_recs and self._current_id == seeded and len(self._radio_pool) >= size:
+                        continue
+                    if not is_recs and len(self._radio_pool) >= size:
+                        break
+                    added = self._radio_pool.add(self._rank_candidates(fetch(), shuffle=shuffle)[:size], size, front=is_recs)
+                    if is_recs: seeded = self._current_id
+                    if added: logging.debug(f"📻 Reserva de radio: +{added} ({len(self._radio_pool)}/{size})")
+                self._prefetch_radio_head()
+            except Exception as e:
+                logging.error(f"Error recolectando candidatos de radio: {e}")
+
+    def _prefetch_radio_head(self):
+        """Descarga la cabeza de la reserva para que elegirla no espere a la red."""
+        head = self._radio_pool.peek(self._radio_still_valid)
+        if not head: return
+        current = self._radio_prefetch
+        if current and current[0] == head["id"] and os.path.exists(current[1]): return
+        fpath = download_media(head.get("page_url") or head.get("url"), prefix=TEMP_AUDIO_PREFIX, video_id=head["id"])
+        if not fpath: return
+        with self._lock:
+            old, self._radio_prefetch = self._radio_prefetch, (head["id"], fpath)
+        if old: self._discard_radio_prefetch(old)
+        logging.debug(f"📻 Cabeza de la reserva descargada: {head['title']}")
 
+    def _take_radio_prefetch(self, info):
+        """(info, fpath) si 'info' es la cabeza ya descargada; si no, None (y se descarta la obsoleta)."""
+        with self._lock:
+            prefetch, self._radio_prefetch = self._radio_prefetch, None
+        if not prefetch: return None
+        if prefetch[0] == info["id"] and os.path.exists(prefetch[1]):
+            return info, prefetch[1]
+        self._discard_radio_prefetch(prefetch)
+        return None
+
+    def _discard_radio_prefetch(self, prefetch):
+        fpath = prefetch[1]
+        if fpath not in self._cache_paths_in_use() and not AUDIO_CACHE.owns(fpath):
+            try: os.remove(fpath)
+            except OSError: pass
+
+    def _rank_candidates(self, entries, strict=True, shuffle=False):
+        """Filtra y ordena una página entera de candidatos solo con metadatos planos (sin red ni descargas).
+           Puntuación: relevancia de la fuente (su orden), variedad frente a lo que suena y duración típica
+           de canción. Con shuffle el orden de la fuente no cuenta (p.ej. favoritos)."""
+        ranked = []
+        n = len(entries)
+        for pos, e in enumerate(entries):
+            if not e or not e.get("id") or e["id"] == self._current_id: continue
+            info = dict(e)
+            if not info.get("duration") or not info.get("title"):
+                known = METADATA.get(info["id"], max_age=float("inf"))
+                if known:
+                    info["duration"] = info.get("duration") or known["duration"]
+                    info["title"] = info.get("title") or known["title"]
+            info["duration"] = info.get("duration") or 0
+            if not info.get("title"): continue
+            info.setdefault("url", f"https://www.youtube.com/watch?v={info['id']}")
+
+            ratio = 0.0
+            if strict:
+                if not is_content_allowed(info, self.config): continue
+                if self._is_recent_duplicate(info["title"]): continue
+                ratio = self._title_similarity(self._current_title, info["title"])
+
+            score = (0.0 if shuffle else 1.0 - pos / n) + 0.5 * (1.0 - ratio)
+            if 120 <= info["duration"] <= 420: score += 0.5
+            ranked.append((score, -pos, info))
+        ranked.sort(key=lambda r: (r[0], r[1]), reverse=True)
+        return [info for _, _, info in ranked]
+
+    def _download_best(self, entries, strict=True, shuffle=False, attempts=3):
+        """Descarga el mejor candidato de la página; si falla la descarga, el siguiente (máx. 'attempts')."""
+        ranked = self._rank_candidates(entries, strict=strict, shuffle=shuffle)
+        if ranked:
+            logging.info(f"🏅 {len(ranked)}/{len(entries)} candidatos válidos; mejor: {ranked[0]['title']}")
+        for info in ranked[:attempts]:
+            res = self._try_candidate(info, strict=False) # Ya filtrado
+            if res: return res
+        return None
 
     def _try_candidate(self, info, strict=True):
         if not info: return None
         if strict:
-            if info["title"] in self.history: return None
             if not is_content_allowed(info, self.config): return None
-            if self._is_too_similar(self._current_title, info["title"])[0]: return None
+            if self._is_recent_duplicate(info["title"]): return None
         
-        fpath = download_media(info.get("page_url") or info.get("url"), prefix=TEMP_AUDIO_PREFIX)
+        fpath = download_media(info.get("page_url") or info.get("url"), prefix=TEMP_AUDIO_PREFIX, video_id=info.get("id"))
         return (info, fpath) if fpath else None
 
 
@@ -857,12 +2711,10 @@ class AudioPlayer:
         
         # 1. Prioridad: COLA
         while True:
-            target_info = None
-            target_fpath = None
-            with self._lock:
-                if not self.queue:
-                    break
-                target_info, target_fpath = self.queue.pop(0)
+            item = self.queue.pop_front()
+            if not item:
+                break
+            target_info, target_fpath = item
             
             if target_fpath:
                 return (target_info, target_fpath)
@@ -874,7 +2726,7 @@ class AudioPlayer:
                 full_info = get_search_info(target_info["id"])
                 if full_info: target_info.update(full_info)
             
-            fpath = download_media(target_info.get("page_url") or target_info.get("url"), prefix=TEMP_AUDIO_PREFIX)
+            fpath = download_media(target_info.get("page_url") or target_info.get("url"), prefix=TEMP_AUDIO_PREFIX, video_id=target_info.get("id"))
             if fpath:
                 return (target_info, fpath)
             
@@ -900,69 +2752,70 @@ class AudioPlayer:
         # 3. Modo Radio
         if not self.radio_mode: return None
 
-        # 3.1 Recomendaciones
-        if self._current_id:
-            logging.info(f"📋 Evaluando recomendaciones para {self._current_id}...")
-            for entry in get_recommendations(self._current_id):
-                res = self._try_candidate(get_search_info(entry['id']))
-                if res: return res
+        # 3.0 Reserva precargada por el recolector: elegir es O(1)
+        while True:
+            info = self._radio_pool.take(self._radio_still_valid)
+            self._harvest_wake.set() # Reponer lo consumido
+            if not info: break
+            res = self._take_radio_prefetch(info) or self._try_candidate(info, strict=False)
+            if res:
+                logging.info(f"📻 Radio desde la reserva ({len(self._radio_pool)} restantes): {info['title']}")
+                return res
 
-        # 3.2 Última búsqueda
-        if self._last_query:
-            logging.info(f"📋 Buscando en resultados de '{self._last_query}'...")
-            for i in range(1, 10):
-                info = get_search_info(self._last_query, index=self._last_index + i)
-                if not info: break
-                res = self._try_candidate(info)
-                if res: return res
-        
-        # 3.3 Favorito aleatorio
-        favs = load_favorites()
-        if favs:
-            logging.info("🎲 Buscando favorito aleatorio...")
-            for _ in range(min(5, len(favs))):
-                chosen = random.choice(favs)
-                res = self._try_candidate(get_search_info(chosen["id"]))
-                if res:
-                    logging.info(f"🎲 Reiniciando radio con favorito: {res[0]['title']}")
-                    return res
-
-        # 3.4 Artista
-        if self._current_title:
-            artist = self._current_title.split('-')[0].split('(')[0].strip()
-            if len(artist) > 3:
-                logging.info(f"🔍 Buscando más de '{artist}'...")
-                res = self._try_candidate(get_search_info(artist))
-                if res: return res
+        # Reserva vacía: recorrido síncrono de las fuentes. Cada fuente aporta una página entera
+        # de candidatos que se puntúa solo con metadatos; únicamente el ganador se descarga.
+        for _, msg, fetch, shuffle in self._radio_sources():
+            logging.info(msg)
+            res = self._download_best(fetch(), shuffle=shuffle)
+            if res: return res
         
         logging.warning("⚠️ No se encontraron candidatos adecuados para la radio.")
         return None
 
-    def next_result(self):
-        # Si ya hay algo precargado, lo usamos
-        with self._lock:
+    def next_result(self, seq=None):
+        """Pasa a la siguiente canción. 'seq' (de _on_ended) descarta la llamada si, entre tanto,
+           ya cambió la pista por otro camino."""
+        with self._transition_lock:
+            if seq is not None and seq != self._track_seq: return
+            # Si ya hay algo precargado, lo usamos
             if self._preloaded_data:
-                info, fpath = self._preloaded_data
-                self._preloaded_data = None
-                
                 # Si el dato precargado era el que estaba en el tope de la cola, lo quitamos
-                if self.queue and self.queue[0][0]["id"] == info["id"]:
-                    self.queue.pop(0)
-
+                info, fpath = self._take_preloaded()
                 logging.info(f"⏭️ Usando canción precargada: {info['title']}")
-                self._radio_exhausted = False  # Resetear si encontramos contenido
                 self._start_playback(info, fpath)
                 return
+            seq = self._track_seq
 
+        # Buscar/descargar FUERA del lock: puede tardar segundos y no debe frenar a 'pon',
+        # a la transición gapless ni al fin de pista
         res = self._get_next_candidate_data()
-        if res:
-            self._radio_exhausted = False  # Resetear si encontramos contenido
-            self._start_playback(res[0], res[1])
-        else:
-            # Marcar como exhausta para evitar spam
-            self._radio_exhausted = True
-            logging.warning("⚠️ Radio exhausta: no se encontró ninguna canción nueva. Esperando 30s...")
+        with self._transition_lock:
+            if seq != self._track_seq:
+                # Mientras buscábamos empezó otra canción (o se paró): queda como la siguiente
+                if res:
+                    with self._lock:
+                        if not self._preloaded_data: self._preloaded_data = res
+                return
+            if res:
+                self._radio_exhausted = False  # Resetear si encontramos contenido
+                self._start_playback(res[0], res[1])
+            else:
+                # Marcar como exhausta para evitar spam
+                self._radio_exhausted = True
+                logging.warning("⚠️ Radio exhausta: no se encontró ninguna canción nueva. Esperando 30s...")
+
 
+    def seek(self, seconds):
+        """Salta a 'seconds' dentro del tema actual sin volver a decodificarlo desde el principio."""
+        if not self._playback_active: return None
+        dur = self._current_duration or 0
+        target = max(0.0, min(float(seconds), dur - 1 if dur > 1 else float(seconds)))
+        self._engine.seek(target)
+        logging.info(f"⏩ Posición: {int(target//60)}:{int(target%60):02d}")
+        return target
+
+    def seek_relative(self, delta):
+        return self.seek(self._pts_ms / 1000.0 + delta)
 
     def pause(self):
         self._paused = True
@@ -982,62 +2835,76 @@ class AudioPlayer:
         return title
 
     def get_playback_info(self):
-        with self._lock:
-            title = self._fmt_title(self._current_info)
-            r = "ON" if self.radio_mode else "OFF"
-            f = "ON" if self.config.get("filters_enabled", True) else "OFF"
-            fk = self.forced_keyword or "OFF"
-            v_music = int(self._volume * 1000)
-            v_tts = int(self.config.get("tts_volume", 1.0) * 100)
-            m_status = "ON" if self.config.get("listen_enabled", True) else "OFF"
-            
-            pos_str = "0:00/0:00"
-            if self._playback_active:
-                pts = self._pts_ms / 1000.0
-                dur = self._current_duration or 0
-                def fmt_sec(s): return f"{int(s//60)}:{int(s%60):02d}"
-                pos_str = f"   ⏳ {fmt_sec(pts)}/{fmt_sec(dur)}"
+        title = self._fmt_title(self._current_info)
+        r = f"ON ({len(self._radio_pool)} en reserva)" if self.radio_mode else "OFF"
+        f = "ON" if self.config.get("filters_enabled", True) else "OFF"
+        fk = self.forced_keyword or "OFF"
+        v_music = int(self._volume * 1000)
+        v_tts = int(self.config.get("tts_volume", 1.0) * 100)
+        m_status = "ON" if self.config.get("listen_enabled", True) else "OFF"
+        
+        pos_str = "0:00/0:00"
+        out = self._engine.output
+        if self._playback_active and out:
+            pts = self._pts_ms / 1000.0
+            dur = self._current_duration or 0
+            def fmt_sec(s): return f"{int(s//60)}:{int(s%60):02d}"
+            pos_str = (f"   ⏳ {fmt_sec(pts)}/{fmt_sec(dur)}"
+                       f" | 🎚️ Buffer: {int(out.fill_ratio() * 100)}% | Underruns: {out.underruns}"
+                       f" | 🔈 {out.frame_rate} Hz (nativas: {DECODE_STATS.describe('native')}, remuestreadas: {DECODE_STATS.describe('resampled')})")
     
-            next_str = ""
-            if self._preloaded_data: 
-                next_str = f"Siguiente: {self._fmt_title(self._preloaded_data[0])}\n"
-            elif self.queue:
-                next_str = f"Siguiente: {self._fmt_title(self.queue[0][0])} (⏳ cargando)\n"
-            elif self._preloading: 
-                next_str = "Siguiente: ⏳ Buscando...\n"
+        # Sin lock: instantáneas de estado y cola; nunca bloquea al audio ni a las transiciones
+        next_str = ""
+        preloaded, head = self._preloaded_data, self.queue.peek()
+        if preloaded: 
+            next_str = f"Siguiente: {self._fmt_title(preloaded[0])}\n"
+        elif head:
+            next_str = f"Siguiente: {self._fmt_title(head[0])} (⏳ cargando)\n"
+        elif self._preloading: 
+            next_str = "Siguiente: ⏳ Buscando...\n"
     
-            q_str = f" | 📦 Cola: {len(self.queue)}" if self.queue else ""
-            p_str = f" | 📂 Playlist: {self.plist_title}" if self.plist_mode and self.plist_title else ""
+        q_str = f" | 📦 Cola: {len(self.queue)}" if self.queue else ""
+        with self._jobs_lock:
+            jobs = list(self._jobs)
+        j_str = ("| ⏳ Tareas: " + ", ".join(f"{j.label} ({j.status})" for j in jobs) + "\n") if jobs else ""
+        c_str = ""
+        if AUDIO_CACHE.enabled:
+            n, used = AUDIO_CACHE.summary()
+            st = AUDIO_CACHE.stats
+            c_str = (f"| 💾 Caché: {n} temas, {used // (1024 * 1024)}/{AUDIO_CACHE.max_bytes // (1024 * 1024)} MB"
+                     f" | Aciertos: {st['hits']} | Fallos: {st['misses']}"
+                     + (f" | Dañados: {st['corrupt']}" if st["corrupt"] else "") + "\n")
+        p_str = f" | 📂 Playlist: {self.plist_title}" if self.plist_mode and self.plist_title else ""
     
-            return (f"🎵 Sonando: {title}\n{pos_str}\n{next_str}"
-                    f"| 📻 Radio: {r} | 🛡️ Filtros: {f} | 🎯 Forzar: {fk}{q_str}{p_str}\n"
-                    f"| 🔊 Música: {v_music}% | 🗣️ Voz: {v_tts}%\n"
+        return (f"🎵 Sonando: {title}\n{pos_str}\n{next_str}"
+                f"| 📻 Radio: {r} | 🛡️ Filtros: {f} | 🎯 Forzar: {fk}{q_str}{p_str}\n"
+                f"| 🔊 Música: {v_music}% | 🗣️ Voz: {v_tts}%\n"
+                f"{c_str}{j_str}"
 
-                    f"| 🎤 Micro: {m_status} [{self.config.get('microphone_index', '0')}]")
+                f"| 🎤 Micro: {m_status} [{self.config.get('microphone_index', '0')}]")
 
     def stop_locked(self):
-        self._session_id += 1 # Invalidar hilos anteriores
         self._manually_stopped = True
-        self._playback_active = False
-        if self._stream:
-            try: self._stream.stop_stream()
-            except: pass
-        self._audio_segment = None
+        with self._transition_lock:
+            self._track_seq += 1
+        with self._lock:
+            self._armed_next = None
+        self._engine.stop()
 
     def stop(self):
-        with self._lock:
-            self.stop_locked()
+        self.stop_locked()
 
     def set_volume(self, percent: int):
-        with self._lock:
-            max_v = self.config.get("max_volume", 0.2)
-            min_v = self.config.get("min_volume", 0.0)
-            v = max(min_v, min(max_v, percent / 1000.0))
-            self._volume = v
-            self.config["volume"] = v
-            save_config(self.config)
-            # Mostramos el porcentaje real sobre 1000 para consistencia visual con el comando
-            logging.info(f"🔊 Volumen: {int(v*1000)}% (Límite: {int(min_v*1000)}-{int(max_v*1000)}%)")
+        # La ganancia se aplica por asignación atómica en GainStage: no hace falta lock
+        max_v = self.config.get("max_volume", 0.2)
+        min_v = self.config.get("min_volume", 0.0)
+        v = max(min_v, min(max_v, percent / 1000.0))
+        self._volume = v
+        self._gain.set_volume(v)
+        self.config["volume"] = v
+        save_config(self.config)
+        # Mostramos el porcentaje real sobre 1000 para consistencia visual con el comando
+        logging.info(f"🔊 Volumen: {int(v*1000)}% (Límite: {int(min_v*1000)}-{int(max_v*1000)}%)")
 
     def add_favorite(self, info):
         if not info: return "No hay canción para añadir"
@@ -1054,11 +2921,12 @@ class AudioPlayer:
         lines = [f"{i+1}. {f['title']}" for i, f in enumerate(favs)]
         return "\n".join(lines)
 
-    def import_playlist(self, url):
+    def import_playlist(self, url, job=None):
         logging.info(f"📥 Importando playlist desde: {url}")
         ydl_opts = _get_ytdl_opts(quiet=True)
         try:
-            with YoutubeDL(ydl_opts) as ydl:
+            with YTDL_POOL.acquire(ydl_opts) as ydl:
+                if job: job.progress("Extrayendo lista...")
                 res = ydl.extract_info(url, download=False)
                 if not res: return "No se pudo extraer información."
                 
@@ -1070,6 +2938,7 @@ class AudioPlayer:
                         plist_id = m.group(1)
                         plist_url = f"https://www.youtube.com/playlist?list={plist_id}"
                         logging.info(f"🔄 Detectado ID de playlist en URL, re-intentando extracción: {plist_url}")
+                        if job: job.progress("Extrayendo lista completa...")
                         res = ydl.extract_info(plist_url, download=False)
                         if not res: return "No se pudo extraer información de la playlist forzada."
 
@@ -1096,7 +2965,11 @@ class AudioPlayer:
                     orphaned = [s for s in old_songs if s["id"] not in new_ids]
                     
                     keep_orphans = False
-                    if orphaned:
+                    if orphaned and job:
+                        # En segundo plano no hay prompt: conservar es lo que no pierde datos ('pc' las revisa)
+                        keep_orphans = True
+                        logging.info(f"ℹ️ '{playlist_title}': {len(orphaned)} canciones locales ya no están en YouTube; se conservan (revísalas con 'pc').")
+                    elif orphaned:
                         print(f"\n❓ Conflict detected: '{playlist_title}' ({playlist_id}) already exists.")
                         ans = input(f"   Se han detectado {len(orphaned)} canciones locales que ya no están en YouTube.\n   ¿Deseas conservar las viejas canciones? (s/n): ").lower()
                         keep_orphans = (ans == 's')
@@ -1143,8 +3016,11 @@ class AudioPlayer:
                     "songs": current_songs
                 }
                 
+                if job: job.check() # Última oportunidad de cancelar antes de escribir
                 save_playlists(all_playlists)
                 return msg
+        except JobCancelled:
+            raise
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -1156,14 +3032,22 @@ class AudioPlayer:
         if not title: return True
         return any(x in title.lower() for x in ["deleted video", "private video", "v\u00eddeo eliminado", "v\u00eddeo privado", "wayback machine", "internet archive"])
 
-    def _rescue_id(self, s_id, meta_map=None, verbose=True, logger_func=None, sos_only=False):
+    def _rescue_id(self, s_id, meta_map=None, verbose=True, logger_func=None, sos_only=False, limiter=None):
         """
         Unified engine to rescue a video title from an unavailable ID.
         Priority: Meta (if provided) > Flat > WayBack > SOS Search.
         If sos_only=True, skips Meta and Flat.
+        If limiter is given, every network request goes through its rate control.
         Returns: (recovered_title, method_label) or (None, None)
         """
         if logger_func is None: logger_func = logging.info
+
+        def fetch(fn):
+            return limiter.run(fn) if limiter else fn()
+
+        def read_url(url):
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                return resp.read()
         if verbose: logger_func(f"    🔎 Buscando rescate para {s_id}...")
         
         if not sos_only:
@@ -1174,16 +3058,23 @@ class AudioPlayer:
                     if verbose: logger_func(f"    ♻️ [meta] Encontrado: {t}")
                     return t, "meta"
             
+            # 1.1 Almacén local de metadatos: último título conocido, sin importar su antigüedad
+            known = METADATA.get(s_id, max_age=float("inf"))
+            if known and known["title"] and not self._is_title_generic(known["title"]):
+                if verbose: logger_func(f"    ♻️ [meta] Encontrado en metadatos locales: {known['title']}")
+                return known["title"], "meta"
+
             # 2. Flat Extraction (Direct from YouTube)
             if verbose: logger_func(f"    ⏳ [flat] Intentando extracción directa...")
             # Silenciamos errores de yt-dlp aquí para que no ensucien la consola si falla el Flat
             ydl_opts = _get_ytdl_opts(quiet=True)
             ydl_opts.update({"logger": None, "no_warnings": True, "quiet": True})
             try:
-                with YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(f"https://www.youtube.com/watch?v={s_id}", download=False)
+                with YTDL_POOL.acquire(ydl_opts) as ydl:
+                    info = fetch(lambda: ydl.extract_info(f"https://www.youtube.com/watch?v={s_id}", download=False))
                     t = info.get("title")
                     if t and not self._is_title_generic(t):
+                        METADATA.record({"id": s_id, "title": t, "duration": info.get("duration"), "uploader": info.get("uploader")})
                         if verbose: logger_func(f"    🔎 [flat] Encontrado: {t}")
                         return t, "flat"
             except: pass
@@ -1202,38 +3093,36 @@ class AudioPlayer:
             try:
                 wb_api = f"https://archive.org/wayback/available?url={base_url}"
                 if verbose: logger_func(f"    ⏳ [sos(wayback)] Consultando archivo ({base_url.split('/')[-1]})...")
-                with urllib.request.urlopen(wb_api, timeout=5) as resp:
-                    data = json.loads(resp.read().decode())
-                    snap = data.get("archived_snapshots", {}).get("closest")
-                    if snap and snap.get("available"):
-                        snap_url = snap["url"]
-                        
-                        # Intento 1: Extracción rápida vía urllib (más eficiente)
-                        try:
-                            with urllib.request.urlopen(snap_url, timeout=5) as page:
-                                html = page.read().decode('utf-8', errors='replace')
-                                match = re.search(r"<title>(.*?)</title>", html, re.I | re.S)
-                                if match:
-                                    wt = match.group(1).replace(" - YouTube", "").replace("YouTube", "").strip()
-                                    wt = wt.replace("&quot;", "\"").replace("&#39;", "'").replace("&amp;", "&")
-                                    if wt and len(wt) > 5 and not self._is_title_generic(wt):
-                                        if verbose: logger_func(f"    🆘 [sos(wayback)] Encontrado (urllib): {wt}")
-                                        return wt, "sos(wayback)"
-                        except: pass
-                        
-                        # Intento 2: Fallback a yt-dlp (más pesado pero entiende mejor el HTML de memento)
-                        try:
-                            if verbose: logger_func(f"    ⏳ [sos(wayback)] Fallback a yt-dlp para snapshot...")
-                            with YoutubeDL(ydl_opts) as ydl_wb:
-                                wb_info = ydl_wb.extract_info(snap_url, download=False)
-                                wt = wb_info.get("title")
-                                if wt:
-                                    clean_wt = wt.replace(s_id, "").replace(" - YouTube", "").replace("YouTube", "").strip(" - ")
-                                    clean_wt = clean_wt.replace("(snapshot)", "").strip()
-                                    if len(clean_wt) > 5 and not self._is_title_generic(clean_wt):
-                                        if verbose: logger_func(f"    🆘 [sos(wayback)] Encontrado (ytdl): {clean_wt}")
-                                        return clean_wt, "sos(wayback)"
-                        except: pass
+                data = json.loads(fetch(lambda: read_url(wb_api)).decode())
+                snap = data.get("archived_snapshots", {}).get("closest")
+                if snap and snap.get("available"):
+                    snap_url = snap["url"]
+                    
+                    # Intento 1: Extracción rápida vía urllib (más eficiente)
+                    try:
+                        html = fetch(lambda: read_url(snap_url)).decode('utf-8', errors='replace')
+                        match = re.search(r"<title>(.*?)</title>", html, re.I | re.S)
+                        if match:
+                            wt = match.group(1).replace(" - YouTube", "").replace("YouTube", "").strip()
+                            wt = wt.replace("&quot;", "\"").replace("&#39;", "'").replace("&amp;", "&")
+                            if wt and len(wt) > 5 and not self._is_title_generic(wt):
+                                if verbose: logger_func(f"    🆘 [sos(wayback)] Encontrado (urllib): {wt}")
+                                return wt, "sos(wayback)"
+                    except: pass
+                    
+                    # Intento 2: Fallback a yt-dlp (más pesado pero entiende mejor el HTML de memento)
+                    try:
+                        if verbose: logger_func(f"    ⏳ [sos(wayback)] Fallback a yt-dlp para snapshot...")
+                        with YTDL_POOL.acquire(ydl_opts) as ydl_wb:
+                            wb_info = fetch(lambda: ydl_wb.extract_info(snap_url, download=False))
+                            wt = wb_info.get("title")
+                            if wt:
+                                clean_wt = wt.replace(s_id, "").replace(" - YouTube", "").replace("YouTube", "").strip(" - ")
+                                clean_wt = clean_wt.replace("(snapshot)", "").strip()
+                                if len(clean_wt) > 5 and not self._is_title_generic(clean_wt):
+                                    if verbose: logger_func(f"    🆘 [sos(wayback)] Encontrado (ytdl): {clean_wt}")
+                                    return clean_wt, "sos(wayback)"
+                    except: pass
             except: pass
             
         # 4. SOS Search (Google / DuckDuckGo)
@@ -1243,8 +3132,8 @@ class AudioPlayer:
             try:
                 # Prioridad 1: ID literal. Prioridad 2: Con contexto.
                 for q in [s_id, f"youtube {s_id}"]:
-                    with YoutubeDL(ydl_opts) as ydl:
-                        res = ydl.extract_info(f"{query_pref}:{q}", download=False)
+                    with YTDL_POOL.acquire(ydl_opts) as ydl:
+                        res = fetch(lambda: ydl.extract_info(f"{query_pref}:{q}", download=False))
                         if res and "entries" in res and res["entries"]:
                             st = res["entries"][0].get("title")
                             if st:
@@ -1258,7 +3147,17 @@ class AudioPlayer:
         if verbose: logger_func(f"    ❌ No se pudo recuperar el título para {s_id}")
         return None, None
 
-    def check_playlists(self, query=None, deep=False, only_recovered=False):
+    def check_playlists(self, query=None, deep=False, only_recovered=False, full=False, resume=False):
+        # Diario: cada canción comprobada se anota al momento; 'pcresume' continúa desde ahí
+        journal_done = {}
+        if resume:
+            header, journal_done = _read_pc_journal()
+            if not header: return "No hay ninguna verificación interrumpida que reanudar."
+            query, deep, only_recovered, full = header["query"], header["deep"], header["only_recovered"], header["full"]
+            logging.info(f"⏯️ Reanudando la verificación del {time.strftime('%d/%m %H:%M', time.localtime(header['started']))} ({len(journal_done)} canciones ya comprobadas)...")
+        elif os.path.exists(PC_JOURNAL_FILE):
+            logging.info("ℹ️ Se descarta la verificación interrumpida anterior (usa 'pcresume' para continuarla).")
+
         all_playlists = load_playlists()
         if not all_playlists: return "No hay playlists para verificar."
         
@@ -1280,12 +3179,19 @@ class AudioPlayer:
         total_deleted = 0
         total_songs = sum(len(pdata.get("songs", [])) for pdata in target_playlists.values())
         processed_count = 0
+        # Modo incremental: solo se re-verifica lo comprobado hace más de 'pc_recheck_hours'.
+        # pcf (full) y los modos profundos lo verifican todo.
+        incremental = not (full or deep)
+        max_age = self.config.get("pc_recheck_hours", 168) * 3600
+        skipped_fresh = 0
+        avoided_requests = 0
+        stamped_any = False
         unavailable_reports = []
         to_delete_map = {} # {pid: [indices_to_remove]}
         recovered_any = False
 
-        should_save = True
-        if deep:
+        should_save = header.get("save", True) if resume else True
+        if deep and not resume:
             print("\n🚀 PCD (Deep Check): Escaneo agresivo SOS-Only.")
             print("Este modo ignora metadatos locales y busca directamente en archivos web y buscadores.")
             ans = input("¿Deseas guardar los resultados en el JSON al finalizar? (s/n): ").strip().lower()
@@ -1298,151 +3204,261 @@ class AudioPlayer:
         else:
             logging.info(f"🔍 Verificando {len(target_playlists)} playlist(s) ({total_songs} canciones)...")
         
+        if not resume:
+            try: os.remove(PC_JOURNAL_FILE)
+            except OSError: pass
+            _append_pc_journal({"started": int(time.time()), "query": query, "deep": deep,
+                                "only_recovered": only_recovered, "full": full, "save": should_save})
+
         ydl_opts_flat = _get_ytdl_opts(quiet=True)
         ydl_opts_flat.update({"extract_flat": True, "no_warnings": True, "quiet": True, "logger": None})
         ydl_opts_check = _get_ytdl_opts(quiet=True)
         ydl_opts_check.update({"no_warnings": True, "quiet": True, "logger": None})
 
-        num_threads = self.config.get("pc_threads", 4)
+        # pc_threads es solo el punto de partida: el limitador sube o baja según responda YouTube.
+        # Todas las peticiones de red (listado, comprobación y rescate) pasan por él.
+        limiter = AdaptiveLimiter.from_config(self.config)
+        num_threads = int(limiter.max_limit)
+        unverified = 0
+        unverified_keys = set() # (pid, índice) sin verificar: no van al diario para que 'pcresume' las repita
         report_lock = threading.Lock()
 
-        # Bucle principal
-        with YoutubeDL(ydl_opts_check) as ydl:
-            for pid, pdata in target_playlists.items():
-                p_title = pdata.get("title", pid)
-                
-                # --- PASO 1: Intentar recuperar títulos vía metadatos de PLAYLIST ---
-                meta_map = {}
-                if len(pid) > 5 and not pid.startswith("migrated"):
-                    try:
-                        logging.info(f"⏳ Recuperando metadatos de la lista '{p_title}'...")
-                        with YoutubeDL(ydl_opts_flat) as ydl_flat:
-                            plist_info = ydl_flat.extract_info(f"https://www.youtube.com/playlist?list={pid}", download=False)
-                            if plist_info and "entries" in plist_info:
-                                for entry in plist_info["entries"]:
-                                    if entry and entry.get("id"):
-                                        t = entry.get("title")
-                                        if t and not any(x in t.lower() for x in ["deleted video", "private video", "v\u00eddeo eliminado", "v\u00eddeo privado"]):
-                                            meta_map[entry["id"]] = t
-                    except: pass
-                
-                songs_list = pdata.get("songs", [])
-                valid_indices = []
+        # Un mismo ID puede estar en varias playlists: se comprueba/rescata una sola vez
+        # por ejecución y el resultado se aplica en todas (los demás hilos esperan al primero).
+        id_results = {} # {(tipo, id): Future}
+        shared_hits = 0
+
+        def resolve_once(key, fn):
+            nonlocal shared_hits
+            with report_lock:
+                fut = id_results.get(key)
+                owner = fut is None
+                if owner:
+                    fut = id_results[key] = concurrent.futures.Future()
+                else:
+                    shared_hits += 1
+            if owner:
+                try: fut.set_result(fn())
+                except Exception as e: fut.set_exception(e)
+            return fut.result()
+
+        # Bucle principal (cada hilo toma su propio extractor del pool)
+        for pid, pdata in target_playlists.items():
+            p_title = pdata.get("title", pid)
+            
+            # --- PASO 1: Intentar recuperar títulos vía metadatos de PLAYLIST ---
+            meta_map = {}
+            if len(pid) > 5 and not pid.startswith("migrated"):
+                try:
+                    logging.info(f"⏳ Recuperando metadatos de la lista '{p_title}'...")
+                    with YTDL_POOL.acquire(ydl_opts_flat) as ydl_flat:
+                        plist_info = limiter.run(lambda: ydl_flat.extract_info(f"https://www.youtube.com/playlist?list={pid}", download=False))
+                        if plist_info and "entries" in plist_info:
+                            for entry in plist_info["entries"]:
+                                if entry and entry.get("id"):
+                                    t = entry.get("title")
+                                    if t and not any(x in t.lower() for x in ["deleted video", "private video", "v\u00eddeo eliminado", "v\u00eddeo privado"]):
+                                        meta_map[entry["id"]] = t
+                except: pass
+            
+            songs_list = pdata.get("songs", [])
+            valid_indices = []
+            
+            def check_worker(index_song_tuple):
+                nonlocal recovered_any, total_deleted, processed_count, skipped_fresh, stamped_any, avoided_requests, unverified
+                idx, s = index_song_tuple
+                s_id = s.get("id")
                 
-                def check_worker(index_song_tuple):
-                    nonlocal recovered_any, total_deleted, processed_count
-                    idx, s = index_song_tuple
-                    s_id = s.get("id")
-                    
-                    # MEJORA: pcr (solo recuperadas)
-                    if only_recovered and not s.get("recovery_method"):
-                        return (idx, True, None) # (index, is_valid, report_line)
-
-                    # Limpieza base
-                    raw_title = s.get("title", s_id)
-                    current_title = re.sub(r"[♻️🔎🆘\u267b\ufe0f]", "", raw_title).strip()
-                    current_method = s.get("recovery_method")
-
-                    # PASO 2: Disponibilidad Real
-                    is_available = False
+                # MEJORA: pcr (solo recuperadas)
+                if only_recovered and not s.get("recovery_method"):
+                    return (idx, True, None) # (index, is_valid, report_line)
+
+                # Limpieza base
+                raw_title = s.get("title", s_id)
+                current_title = re.sub(r"[♻️🔎🆘\u267b\ufe0f]", "", raw_title).strip()
+                current_method = s.get("recovery_method")
+
+                # PASO 1.5: Verificada hace poco -> se reutiliza su último estado sin red
+                if incremental and s.get("last_status") and time.time() - s.get("last_verified", 0) < max_age:
+                    rep_title = f"{current_title} (verificada hace {int((time.time() - s['last_verified']) // 3600)}h)"
+                    with report_lock:
+                        processed_count += 1
+                        skipped_fresh += 1
+                        if s["last_status"] == "available":
+                            return (idx, True, None)
+                        total_deleted += 1
+                        print(f"❌ No disponible: {rep_title} ({s_id})")
+                    return (idx, False, f"- {rep_title} (ID: {s_id}) (Playlist: {p_title})")
+
+                # PASO 2: Disponibilidad Real
+                # Vía rápida: si el listado plano de la playlist la trae con título real, está viva
+                # y nos ahorramos la petición individual (pcd no se fía del listado).
+                if not deep and s_id in meta_map and not self._is_title_generic(meta_map[s_id]):
+                    is_available = True
+                    with report_lock:
+                        avoided_requests += 1
+                        if ("check", s_id) not in id_results:
+                            id_results[("check", s_id)] = done = concurrent.futures.Future()
+                            done.set_result(True)
+                else:
+                    def probe():
+                        # Siempre contra YouTube: el modo incremental ya lo deciden las marcas
+                        # last_verified, y pcf/pcd deben re-verificar de verdad.
+                        with YTDL_POOL.acquire(ydl_opts_check) as ydl:
+                            return check_video_available(ydl, s_id, use_store=False, limiter=limiter)[0]
                     try:
-                        ydl.extract_info(f"https://www.youtube.com/watch?v={s_id}", download=False)
-                        is_available = True
-                    except:
-                        is_available = False
-
-                    if is_available:
-                        # Limpiar etiquetas si está vivo
-                        updated = False
-                        if current_method:
-                            del s["recovery_method"]
-                            updated = True
-                        s["title"] = current_title
+                        is_available = resolve_once(("check", s_id), probe)
+                    except Exception as e:
+                        if not _is_throttle_error(e): raise
+                        # YouTube sigue frenando tras los reintentos: se conserva sin marca y se mira en el próximo pc
                         with report_lock:
                             processed_count += 1
-                            print(f"👁️‍🗨️ [{processed_count}/{total_songs}] Disponible: {current_title} (en {p_title})")
-                            if updated: recovered_any = True
+                            unverified += 1
+                            unverified_keys.add((pid, idx))
                         return (idx, True, None)
-                    
-                    # PASO 3: Rescate (No disponible)
-                    # Invalidar meta si no está en el mapa
-                    if current_method == "meta" and s_id not in meta_map:
-                        current_method = None
-                    
-                    is_generic = self._is_title_generic(current_title)
-                    # MEJORA: Si es pcd/pcdr (deep), forzamos el intento de rescate ignorando etiquetas previas
-                    if is_generic or current_title == s_id or not current_method or deep:
+                s["last_verified"] = int(time.time())
+                s["last_status"] = "available" if is_available else "unavailable"
+                with report_lock: stamped_any = True
+
+                if is_available:
+                    # Limpiar etiquetas si está vivo
+                    updated = False
+                    if current_method:
+                        del s["recovery_method"]
+                        updated = True
+                    s["title"] = current_title
+                    with report_lock:
+                        processed_count += 1
+                        print(f"👁️‍🗨️ [{processed_count}/{total_songs}] Disponible: {current_title} (en {p_title})")
+                        if updated: recovered_any = True
+                    return (idx, True, None)
+                
+                # PASO 3: Rescate (No disponible)
+                # Invalidar meta si no está en el mapa
+                if current_method == "meta" and s_id not in meta_map:
+                    current_method = None
+                
+                is_generic = self._is_title_generic(current_title)
+                # MEJORA: Si es pcd/pcdr (deep), forzamos el intento de rescate ignorando etiquetas previas
+                if is_generic or current_title == s_id or not current_method or deep:
+                    def rescue():
                         # Reintentos de rescate (max 3)
                         for attempt in range(1, 4):
-                            recovered_title, source_label = self._rescue_id(s_id, meta_map=meta_map, verbose=(attempt==1), sos_only=deep)
+                            recovered_title, source_label = self._rescue_id(s_id, meta_map=meta_map, verbose=(attempt==1), sos_only=deep, limiter=limiter)
                             if recovered_title:
-                                s["title"] = recovered_title
-                                s["recovery_method"] = source_label
-                                if "recycled" in s: del s["recycled"]
-                                current_title = recovered_title
-                                current_method = source_label
-                                with report_lock:
-                                    recovered_any = True
-                                    r_icon = "♻️" if source_label == "meta" else ("🔎" if source_label == "flat" else "🆘")
-                                    logging.info(f"{r_icon} Título recuperado para {s_id} [{source_label}] (Intento {attempt}): {recovered_title}")
-                                break
-                            else:
-                                if deep and attempt == 3:
-                                    # Si es PCD y NO encontramos nada por SOS tras 3 intentos, marcamos como failed
-                                    if not current_method or "sos" not in current_method:
-                                        s["recovery_method"] = "failed"
-                                        current_method = "failed"
-                                        with report_lock: recovered_any = True
-
-                    # Fallback failed (para PC normal o si pcd/pcdr falló tras retries)
-                    if not s.get("recovery_method") and not self._is_title_generic(current_title) and current_title != s_id:
-                        s["recovery_method"] = "failed"
-                        current_method = "failed"
+                                r_icon = "♻️" if source_label == "meta" else ("🔎" if source_label == "flat" else "🆘")
+                                logging.info(f"{r_icon} Título recuperado para {s_id} [{source_label}] (Intento {attempt}): {recovered_title}")
+                                return recovered_title, source_label
+                        return None, None
+
+                    recovered_title, source_label = resolve_once(("rescue", s_id), rescue)
+                    if recovered_title:
+                        s["title"] = recovered_title
+                        s["recovery_method"] = source_label
+                        if "recycled" in s: del s["recycled"]
+                        current_title = recovered_title
+                        current_method = source_label
                         with report_lock: recovered_any = True
-
-                    # Título final para el reporte
-                    emo = "🆘" if (current_method == "failed" or (current_method and "sos" in current_method)) else ("♻️" if current_method == "meta" else ("🔎" if current_method == "flat" else ""))
-                    
-                    # MEJORA: Añadir procedencia detallada al reporte
-                    source_tag = ""
-                    if current_method == "failed":
-                        source_tag = " failed"
-                    elif current_method == "sos(wayback)":
-                        source_tag = " (WayBack)"
-                    elif current_method == "sos(google)":
-                        source_tag = " (Google)"
-                    elif current_method == "sos(ddg)":
-                        source_tag = " (DDG)"
-                    elif current_method == "meta":
-                        source_tag = " (Meta)"
-                    elif current_method == "flat":
-                        source_tag = " (Flat)"
-
-                    rep_title = f"{emo} {current_title} {emo}".strip() if emo else current_title
-                    
-                    with report_lock:
-                        processed_count += 1
-                        total_deleted += 1
-                        print(f"❌ No disponible: {rep_title}{source_tag} ({s_id})")
-                    
-                    return (idx, False, f"- {rep_title}{source_tag} (ID: {s_id}) (Playlist: {p_title})")
-
-                # Ejecutar hilos
-                with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
-                    results = list(executor.map(check_worker, enumerate(songs_list)))
+                    elif deep:
+                        # Si es PCD y NO encontramos nada por SOS tras 3 intentos, marcamos como failed
+                        if not current_method or "sos" not in current_method:
+                            s["recovery_method"] = "failed"
+                            current_method = "failed"
+                            with report_lock: recovered_any = True
+
+                # Fallback failed (para PC normal o si pcd/pcdr falló tras retries)
+                if not s.get("recovery_method") and not self._is_title_generic(current_title) and current_title != s_id:
+                    s["recovery_method"] = "failed"
+                    current_method = "failed"
+                    with report_lock: recovered_any = True
+
+                # Título final para el reporte
+                emo = "🆘" if (current_method == "failed" or (current_method and "sos" in current_method)) else ("♻️" if current_method == "meta" else ("🔎" if current_method == "flat" else ""))
                 
-                # Procesar resultados
-                for idx, is_valid, report_line in results:
-                    if is_valid:
-                        valid_indices.append(idx)
-                    else:
-                        if report_line:
-                            unavailable_reports.append(report_line)
+                # MEJORA: Añadir procedencia detallada al reporte
+                source_tag = ""
+                if current_method == "failed":
+                    source_tag = " failed"
+                elif current_method == "sos(wayback)":
+                    source_tag = " (WayBack)"
+                elif current_method == "sos(google)":
+                    source_tag = " (Google)"
+                elif current_method == "sos(ddg)":
+                    source_tag = " (DDG)"
+                elif current_method == "meta":
+                    source_tag = " (Meta)"
+                elif current_method == "flat":
+                    source_tag = " (Flat)"
+
+                rep_title = f"{emo} {current_title} {emo}".strip() if emo else current_title
+                
+                with report_lock:
+                    processed_count += 1
+                    total_deleted += 1
+                    print(f"❌ No disponible: {rep_title}{source_tag} ({s_id})")
                 
-                if len(valid_indices) != len(songs_list):
-                    all_indices = set(range(len(songs_list)))
-                    invalid_indices = all_indices - set(valid_indices)
-                    to_delete_map[pid] = sorted(list(invalid_indices), reverse=True)
+                return (idx, False, f"- {rep_title}{source_tag} (ID: {s_id}) (Playlist: {p_title})")
+
+            def journaled_worker(index_song_tuple):
+                nonlocal recovered_any, stamped_any, total_deleted, processed_count
+                idx, s = index_song_tuple
+                done = journal_done.get((pid, idx))
+                if done and done["song"].get("id") == s.get("id"):
+                    # Ya comprobada antes de la interrupción: se reaplica su resultado sin red
+                    with report_lock:
+                        processed_count += 1
+                        if not done["valid"]: total_deleted += 1
+                        if done["song"] != s:
+                            if (s.get("title"), s.get("recovery_method")) != (done["song"].get("title"), done["song"].get("recovery_method")):
+                                recovered_any = True
+                            stamped_any = True
+                            s.clear()
+                            s.update(done["song"])
+                    return (idx, done["valid"], done["report"])
+                result = check_worker(index_song_tuple)
+                with report_lock:
+                    if (pid, idx) in unverified_keys: return result
+                    _append_pc_journal({"pid": pid, "idx": idx, "song": s, "valid": result[1], "report": result[2]})
+                return result
+
+            # Ejecutar hilos
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_threads)
+            try:
+                results = list(executor.map(journaled_worker, enumerate(songs_list)))
+            except BaseException:
+                # Ctrl+C o fallo de red: se descartan las pendientes y se espera a las que ya corren,
+                # para que ninguna escriba en el diario después de salir (o durante el siguiente pc)
+                executor.shutdown(wait=True, cancel_futures=True)
+                logging.warning("⏸️ Verificación interrumpida: usa 'pcresume' para continuar donde se quedó.")
+                raise
+            executor.shutdown()
+            
+            # Procesar resultados
+            for idx, is_valid, report_line in results:
+                if is_valid:
+                    valid_indices.append(idx)
+                else:
+                    if report_line:
+                        unavailable_reports.append(report_line)
+            
+            if len(valid_indices) != len(songs_list):
+                all_indices = set(range(len(songs_list)))
+                invalid_indices = all_indices - set(valid_indices)
+                to_delete_map[pid] = sorted(list(invalid_indices), reverse=True)
+
+        logging.info(f"📈 Ritmo final: {limiter.summary()}")
+        if unverified:
+            logging.warning(f"⚠️ {unverified} canciones sin verificar por límite de YouTube (se conservan).")
+        if shared_hits:
+            logging.info(f"🔗 {shared_hits} comprobaciones reutilizadas de canciones repetidas entre playlists.")
+        if avoided_requests:
+            logging.info(f"⚡ {avoided_requests} canciones confirmadas por el listado de su playlist ({avoided_requests} peticiones ahorradas).")
+        if skipped_fresh:
+            logging.info(f"⏭️ {skipped_fresh} canciones verificadas hace menos de {max_age // 3600}h se han omitido (usa 'pcf' para re-verificar todo).")
+
+        # Guardar las marcas de verificación aunque no se haya recuperado ningún título
+        if stamped_any and not recovered_any and should_save:
+            save_playlists(all_playlists)
 
         # Si recuperamos algo, guardamos los cambios en los títulos inmediatamente
         if recovered_any:
@@ -1452,6 +3468,9 @@ class AudioPlayer:
             else:
                 logging.info("📊 Resultados mostrados arriba (Cambios NO guardados en el JSON).")
 
+        try: os.remove(PC_JOURNAL_FILE)
+        except OSError: pass
+
         print("\n\u2705 Verificaci\u00f3n completada.")
         
         if total_deleted > 0:
@@ -1499,7 +3518,7 @@ class AudioPlayer:
             title = pdata.get("title", pid)
             logging.info(f"⏳ Sincronizando playlist: {title} ({pid})...")
             try:
-                with YoutubeDL(ydl_opts) as ydl:
+                with YTDL_POOL.acquire(ydl_opts) as ydl:
                     res = ydl.extract_info(f"https://www.youtube.com/playlist?list={pid}", download=False)
                     if not res or "entries" not in res:
                         results.append(f"❌ {title}: No se pudo obtener info.")
@@ -1580,14 +3599,21 @@ class AudioPlayer:
         valid = []
         
         ydl_opts = _get_ytdl_opts(quiet=True)
-        with YoutubeDL(ydl_opts) as ydl:
-            for f in favs:
-                try:
-                    ydl.extract_info(f"https://www.youtube.com/watch?v={f['id']}", download=False)
-                    valid.append(f)
-                except:
-                    deleted.append(f["title"])
-        
+        limiter = AdaptiveLimiter.from_config(self.config)
+
+        def check(f):
+            with YTDL_POOL.acquire(ydl_opts) as ydl:
+                try: return check_video_available(ydl, f["id"], limiter=limiter)[0]
+                except Exception as e:
+                    if not _is_throttle_error(e): raise
+                    return True # YouTube sigue frenando: mejor no borrar
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=int(limiter.max_limit)) as executor:
+            for f, ok in zip(favs, executor.map(check, favs)):
+                if ok: valid.append(f)
+                else: deleted.append(f["title"])
+        logging.info(f"📈 Ritmo final: {limiter.summary()}")
+
         if deleted:
             save_favorites(valid)
             return f"He borrado {len(deleted)} favoritos no disponibles: " + ", ".join(deleted)
@@ -1602,26 +3628,38 @@ class AudioPlayer:
             if is_fav: info["_is_fav_playlist"] = True
             else: info["_is_plist"] = True
             
-            fpath = download_media(info.get("url") or info.get("webpage_url"))
+            fpath = download_media(info.get("url") or info.get("webpage_url"), video_id=info.get("id"))
             if fpath:
                 self._start_playback(info, fpath)
-                with self._lock:
-                    for s in songs[1:]: 
-                        # Propagar flags para mantener contexto
-                        meta = {"id": s["id"], "title": s["title"]}
-                        if is_fav: meta["_is_fav_playlist"] = True
-                        else: meta["_is_plist"] = True
-                        self.queue.append((meta, None))
+                # Propagar flags para mantener contexto
+                self._enqueue_jit(songs[1:], flag="_is_fav_playlist" if is_fav else "_is_plist")
+
+    def _enqueue_jit(self, songs, flag=None):
+        """Encola canciones sin descargar (se resuelven justo a tiempo). Un solo paso por el lock de la cola."""
+        items = []
+        for s in songs:
+            meta = {"id": s["id"], "title": s["title"]}
+            if flag: meta[flag] = True
+            items.append((meta, None))
+        self.queue.extend(items)
+
     def execute_command(self, cmd, args, voice_loop=None):
         """Hub central para procesar comandos de cualquier interfaz."""
         logging.info(f"DEBUG: Executing unified command: {cmd} {args}")
 
         if cmd == "help": print(AYUDA_MSG)
         elif cmd == "info": print(self.get_playback_info())
-        elif cmd == "play": self.play_query(args["query"])
+        elif cmd == "play":
+            query = args["query"]
+            self._submit_job("play", f"pon {query}", lambda job: self.play_query(query, job=job))
+        elif cmd == "cancel":
+            n = self.cancel_jobs()
+            if not n: logging.info("⚠️ No hay tareas en curso")
         
         elif cmd in ["pause", "resume", "toggle", "stop"]:
-            if cmd == "stop": self.stop()
+            if cmd == "stop":
+                self.cancel_jobs("play") # Que una búsqueda en curso no empiece a sonar tras el stop
+                self.stop()
             elif cmd == "pause": self.pause()
             elif cmd == "resume": self.resume()
             else:
@@ -1630,17 +3668,25 @@ class AudioPlayer:
 
         elif cmd == "next": self.next_result()
         elif cmd == "replay":
-            if self._current_info and self._current_filepath:
+            # Si sigue sonando basta con volver a 0 (la intro ya está decodificada en memoria)
+            if self.seek(0) is None and self._current_info and self._current_filepath:
                 self._start_playback(self._current_info, self._current_filepath)
 
+        elif cmd == "seek":
+            if "pos" in args: res = self.seek(args["pos"])
+            else: res = self.seek_relative(args["delta"])
+            if res is None: logging.info("⚠️ No hay nada sonando")
+
         elif cmd == "shuffle":
-            with self._lock:
-                if not self.queue: logging.info("⚠️ Cola vacía")
-                else:
-                    random.shuffle(self.queue)
+            if not self.queue: logging.info("⚠️ Cola vacía")
+            else:
+                self.queue.shuffle()
+                with self._lock:
+                    self._disarm_next()
                     self._preloaded_data = None
                     self._preloading = False
-                    logging.info(f"🔀 Cola mezclada ({len(self.queue)})")
+                self._discard_predecoded()
+                logging.info(f"🔀 Cola mezclada ({len(self.queue)})")
 
         elif cmd == "history":
             print("\n📜 ÚLTIMAS CANCIONES:")
@@ -1665,8 +3711,7 @@ class AudioPlayer:
             if pdata:
                 songs = pdata.get("songs", [])
                 logging.info(f"📂 Encolando {len(songs)} canciones de '{pdata.get('title')}' (JIT)")
-                with self._lock:
-                    for s in songs: self.queue.append(({"id": s["id"], "title": s["title"]}, None))
+                self._enqueue_jit(songs)
                 return
 
             logging.info(f"➕ Buscando para añadir: {query}")
@@ -1677,19 +3722,18 @@ class AudioPlayer:
                     if cand and is_content_allowed(cand, self.config):
                         info = cand; break
                 if info:
-                    with self._lock:
-                        self.queue.append((info, None))
-                        if self.plist_mode and self.plist_id:
-                            all_p = load_playlists()
-                            if self.plist_id in all_p:
-                                if not any(s["id"] == info["id"] for s in all_p[self.plist_id].get("songs", [])):
-                                    all_p[self.plist_id].setdefault("songs", []).append({"id": info["id"], "title": info["title"]})
-                                    save_playlists(all_p)
+                    self.queue.append((info, None))
+                    if self.plist_mode and self.plist_id:
+                        all_p = load_playlists()
+                        if self.plist_id in all_p:
+                            if not any(s["id"] == info["id"] for s in all_p[self.plist_id].get("songs", [])):
+                                all_p[self.plist_id].setdefault("songs", []).append({"id": info["id"], "title": info["title"]})
+                                save_playlists(all_p)
                     logging.info(f"✅ Añadido a la cola: {info['title']}")
                 else: logging.warning(f"⚠️ No se encontró nada para: {query}")
             threading.Thread(target=_bg_add, daemon=True).start()
 
-        elif cmd in ["playlist", "playlists", "playlist_remove", "import", "favcheck", "favrandom", "playfav", "playlistcheck", "playlistcheck_deep", "playlistcheck_recovered", "playlistcheck_deep_recovered"]:
+        elif cmd in ["playlist", "playlists", "playlist_remove", "import", "favcheck", "favrandom", "playfav", "playlistcheck", "playlistcheck_full", "playlistcheck_resume", "playlistcheck_deep", "playlistcheck_recovered", "playlistcheck_deep_recovered"]:
             if cmd == "playlists":
                 all_p = load_playlists()
                 if not all_p: print("\n⚠️ No hay playlists.")
@@ -1698,18 +3742,23 @@ class AudioPlayer:
                     for pid, data in all_p.items(): print(f"  - [{pid}] {data.get('title')} ({len(data.get('songs',[]))} canciones)")
                 return
 
-            if cmd == "import": logging.info(f"📥 {self.import_playlist(args['url'])}")
+            if cmd == "import":
+                url = args["url"]
+                self._submit_job("import", "importar", lambda job: logging.info(f"📥 {self.import_playlist(url, job=job)}"))
             elif cmd == "favcheck": logging.info(f"🔍 {self.check_favorites()}")
-            elif cmd in ["playlistcheck", "playlistcheck_deep", "playlistcheck_recovered", "playlistcheck_deep_recovered"]:
+            elif cmd == "playlistcheck_resume":
+                logging.info(f"🔍 {self.check_playlists(resume=True)}")
+            elif cmd in ["playlistcheck", "playlistcheck_full", "playlistcheck_deep", "playlistcheck_recovered", "playlistcheck_deep_recovered"]:
                 deep = (cmd in ["playlistcheck_deep", "playlistcheck_deep_recovered"])
                 recov = (cmd in ["playlistcheck_recovered", "playlistcheck_deep_recovered"])
-                logging.info(f"🔍 {self.check_playlists(query=args.get('q'), deep=deep, only_recovered=recov)}")
+                full = (cmd == "playlistcheck_full")
+                logging.info(f"🔍 {self.check_playlists(query=args.get('q'), deep=deep, only_recovered=recov, full=full)}")
             elif cmd == "favrandom" or cmd == "playfav":
                 favs = load_favorites()
                 if not favs: return print("⚠️ Lista vacía.")
                 if cmd == "favrandom": random.shuffle(favs)
                 self.plist_mode, self.plist_id, self.plist_title = True, "favs", "Favoritos" + (" (Aleatorio)" if cmd == "favrandom" else "")
-                with self._lock: self.queue.clear()
+                self.queue.clear()
                 self._start_playlist_jit(favs, is_fav=True)
             
             else: # playlist o playlist_remove
@@ -1727,7 +3776,7 @@ class AudioPlayer:
                         all_p = load_playlists(); del all_p[target_id]; save_playlists(all_p); print("✅ Eliminada.")
                 else:
                     self.plist_mode, self.plist_id, self.plist_title = True, target_id, pdata.get("title")
-                    with self._lock: self.queue.clear()
+                    self.queue.clear()
                     self._start_playlist_jit(pdata.get("songs", []))
 
         elif cmd == "playlist_update":
@@ -1737,15 +3786,11 @@ class AudioPlayer:
         elif cmd == "force":
             kw = self.set_forced_filter(args["f"])
             if kw:
-                if not self.play_query(kw) and self.config.get("filters_enabled", True):
-                    try:
-                        ans = input("\n⚠️ La búsqueda falló por filtros o duración. ¿Reintentar SIN filtros? (s/n): ").strip().lower()
-                        if ans in ["s", "y", "si"]:
-                            self.config["filters_enabled"] = False
-                            save_config(self.config)
-                            logging.info("🛡️ Filtros desactivados. Reintentando...")
-                            self.play_query(kw)
-                    except (EOFError, KeyboardInterrupt): pass
+                def _force(job):
+                    if not self.play_query(kw, job=job) and self.config.get("filters_enabled", True):
+                        # En segundo plano no se puede preguntar por el prompt: se indica cómo reintentar
+                        logging.warning(f"⚠️ La búsqueda falló por filtros o duración. Para reintentar SIN filtros: 'sin filtros' y 'forzar {kw}'")
+                self._submit_job("play", f"forzar {kw}", _force)
         elif cmd == "listen":
             self.config["listen_enabled"] = args["enabled"]
             save_config(self.config)
@@ -1796,7 +3841,7 @@ class VoiceLoop:
         while not self._stop_flag:
             try:
                 time.sleep(0.5)
-                # Eliminamos self.player.update() de aquí porque ya hay un update_loop independiente
+                # Las transiciones las dispara el propio motor de audio (eventos), no hace falta sondear
                 if not self.player.config.get("listen_enabled", True):
                     time.sleep(1)
                     continue
@@ -1906,18 +3951,239 @@ def check_for_updates():
     except Exception as e:
         logging.warning(f"⚠️ No se pudo comprobar actualizaciones: {e}")
 
+def bench_gain(seconds=60):
+    """Compara el CPU por segundo de audio de la etapa de volumen antigua (pydub) y GainStage."""
+    import math
+    rate, chunk_ms, vol = OUTPUT_RATE, 50, 0.05
+    raw = os.urandom(int(rate * seconds) * OUTPUT_CHANNELS * OUTPUT_SAMPLE_WIDTH)
+    seg = AudioSegment(data=raw, sample_width=OUTPUT_SAMPLE_WIDTH, frame_rate=rate, channels=OUTPUT_CHANNELS)
+    chunk_bytes = int(rate * chunk_ms / 1000) * OUTPUT_CHANNELS * OUTPUT_SAMPLE_WIDTH
+
+    t0 = time.process_time()
+    for pos_ms in range(0, seconds * 1000, chunk_ms):
+        chunk = seg[pos_ms : pos_ms + chunk_ms]
+        gain = 20 * math.log10(vol)
+        _ = (chunk + gain).raw_data
+    legacy = time.process_time() - t0
+
+    stage = GainStage(vol)
+    t0 = time.process_time()
+    for off in range(0, len(raw), chunk_bytes):
+        _ = stage.process(raw[off:off + chunk_bytes])
+    fast = time.process_time() - t0
+
+    backend = "numpy" if np is not None else "audioop"
+    print(f"\n⏱️ Ganancia ({seconds}s de audio, chunks de {chunk_ms}ms)")
+    print(f"   {'pydub (slice + gain + raw_data):':<34}{legacy * 1000 / seconds:.3f} ms CPU / s de audio")
+    print(f"   {f'GainStage [{backend}]:':<34}{fast * 1000 / seconds:.3f} ms CPU / s de audio")
+    if fast > 0: print(f"   Mejora: x{legacy / fast:.1f}\n")
+
+def bench_queue(songs=5000, seconds=8, loaders=4):
+    """Estrés de concurrencia: mientras suena un tono local, 'loaders' hilos cargan cada uno una
+       playlist de 'songs' canciones con _start_playlist_jit (cambio de pista + encolado JIT), a la vez
+       que se mezcla y se consulta info; comprueba que el audio no sufre underruns.
+       El tono se registra en un almacén de metadatos y una caché temporales: no hay red."""
+    global METADATA, AUDIO_CACHE
+    import tempfile
+    import shutil
+    from pydub.generators import Sine
+    tone_id = "vtmbench440"
+    work_dir = tempfile.mkdtemp(prefix="vtm_bench_queue_")
+    saved = (METADATA, AUDIO_CACHE)
+    METADATA = MetadataStore(os.path.join(work_dir, "meta.db"))
+    AUDIO_CACHE = AudioCache(os.path.join(work_dir, "cache"))
+    try:
+        tone = os.path.join(work_dir, f"{tone_id}.wav")
+        Sine(440).to_audio_segment(duration=(seconds + 30) * 1000, volume=-30).export(tone, format="wav")
+        METADATA.record({"id": tone_id, "title": "Tono de prueba 440 Hz", "duration": seconds + 30})
+        tone = AUDIO_CACHE.put(tone_id, tone)
+        _bench_queue_run(songs, seconds, loaders, tone_id, tone)
+    finally:
+        METADATA._conn and METADATA._conn.close()
+        METADATA, AUDIO_CACHE = saved
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _bench_queue_run(songs, seconds, loaders, tone_id, tone):
+    player = AudioPlayer(radio_enabled=False)
+    player.config["hydrate_lookahead"] = 0 # Ids ficticios: que el hidratador no salga a la red
+    player._start_playback({"id": tone_id, "title": "Tono de prueba 440 Hz"}, tone)
+    time.sleep(1) # Dejar que se llene el búfer de salida
+    out = player._engine.output
+    base_underruns = out.underruns
+    worst = {"playlist": 0.0, "shuffle": 0.0, "info": 0.0}
+    stop_at = time.monotonic() + seconds
+
+    def timed(kind, fn):
+        t0 = time.perf_counter()
+        fn()
+        worst[kind] = max(worst[kind], time.perf_counter() - t0)
+
+    def loader(w):
+        # Primera canción: el tono (en caché, sin red); el resto se encola sin descargar
+        playlist = [{"id": tone_id, "title": "Tono de prueba 440 Hz"}]
+        playlist += [{"id": f"bench{w}_{n}", "title": f"Canción de prueba {n}"} for n in range(1, songs)]
+        timed("playlist", lambda: player._start_playlist_jit(playlist))
+
+    def shuffler():
+        while time.monotonic() < stop_at:
+            timed("shuffle", lambda: player.execute_command("shuffle", {}))
+            time.sleep(0.05)
+
+    def reader():
+        while time.monotonic() < stop_at:
+            timed("info", player.get_playback_info)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=loader, args=(w,)) for w in range(loaders)]
+    threads += [threading.Thread(target=shuffler), threading.Thread(target=reader)]
+    logging.getLogger().setLevel(logging.WARNING) # Los logs del shuffle enturbian la medida
+    for t in threads: t.start()
+    for t in threads: t.join()
+    logging.getLogger().setLevel(logging.INFO)
+
+    underruns = out.underruns - base_underruns
+    fill = out.fill_ratio()
+    player.stop()
+
+    print(f"\n⏱️ Estrés de cola ({loaders} playlists de {songs} canciones vía _start_playlist_jit, {seconds}s + shuffle + info)")
+    print(f"   Cola final: {len(player.queue)} canciones")
+    for kind, t in worst.items():
+        print(f"   {f'Peor {kind}:':<16}{t * 1000:.2f} ms")
+    print(f"   Underruns: {underruns} | Búfer al final: {int(fill * 100)}%\n")
+
+def bench_meta(songs=1000, threads=4):
+    """Verificación de disponibilidad de una playlist (hasta 'songs' canciones) con el almacén de
+       metadatos vacío (frío) y recién llenado (caliente). Usa tus playlists/favoritos locales."""
+    global METADATA
+    import tempfile
+    ids = []
+    for pdata in load_playlists().values():
+        ids += [s["id"] for s in pdata.get("songs", [])]
+    ids += [f["id"] for f in load_favorites()]
+    ids = list(dict.fromkeys(ids))[:songs]
+    if not ids:
+        print("⚠️ No hay playlists ni favoritos locales con los que medir (importa una con 'import [url]').")
+        return
+    if len(ids) < songs:
+        print(f"ℹ️ Solo hay {len(ids)} canciones locales distintas; se mide con esas.")
+
+    opts = _get_ytdl_opts(quiet=True)
+    opts.update({"no_warnings": True, "quiet": True, "logger": None})
+    saved, db_path = METADATA, os.path.join(tempfile.gettempdir(), f"vtm_bench_meta_{uuid.uuid4().hex}.db")
+    METADATA = MetadataStore(db_path)
+    try:
+        timings = {}
+        def check(vid):
+            with YTDL_POOL.acquire(opts) as ydl:
+                return check_video_available(ydl, vid)[0]
+        for phase in ("frío", "caliente"):
+            before = METADATA.stats["misses"]
+            t0 = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as ex:
+                available = sum(ex.map(check, ids))
+            timings[phase] = (time.perf_counter() - t0, METADATA.stats["misses"] - before, available)
+    finally:
+        METADATA._conn and METADATA._conn.close()
+        METADATA = saved
+        try: os.remove(db_path)
+        except OSError: pass
+
+    print(f"\n⏱️ Verificación de {len(ids)} canciones ({threads} hilos)")
+    for phase, (t, requests, ok) in timings.items():
+        print(f"   {phase:<9} {t:8.2f} s | consultas a YouTube: {requests:5d} | disponibles: {ok}")
+    cold, warm = timings["frío"][0], timings["caliente"][0]
+    if warm > 0: print(f"   Mejora: x{cold / warm:.0f}\n")
+
+def bench_ytdl(songs=500, threads=4):
+    """Sobrecoste por llamada de crear un YoutubeDL nuevo frente a tomarlo del pool, en una
+       verificación de 'songs' canciones con 'threads' hilos (sin red: solo el coste fijo)."""
+    opts = _get_ytdl_opts(quiet=True)
+    opts.update({"no_warnings": True, "quiet": True, "logger": None})
+    pool = YtdlPool()
+
+    def fresh(_):
+        with YoutubeDL(dict(opts)) as ydl:
+            ydl.get_info_extractor("Youtube")
+
+    def pooled(_):
+        with pool.acquire(opts) as ydl:
+            ydl.get_info_extractor("Youtube")
+
+    timings = {}
+    for name, fn in (("YoutubeDL nuevo por llamada", fresh), ("Pool reutilizable", pooled)):
+        t0 = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as ex:
+            list(ex.map(fn, range(songs)))
+        timings[name] = time.perf_counter() - t0
+
+    print(f"\n⏱️ Sobrecoste de extractor ({songs} canciones, {threads} hilos)")
+    for name, t in timings.items():
+        print(f"   {name + ':':<30}{t:7.3f} s total | {t * 1000 / songs:6.2f} ms / canción")
+    print(f"   Instancias creadas por el pool: {pool.stats['created']} (reutilizadas {pool.stats['reused']})")
+    fresh_t, pooled_t = timings.values()
+    print(f"   Ahorro: {fresh_t - pooled_t:.3f} s en la verificación\n")
+
+def bench_limiter(songs=600, latency=0.2, server_rate=40.0):
+    """Verificación simulada contra un 'YouTube' que responde en 'latency' s y devuelve 429 si se
+       superan 'server_rate' req/s: hilos fijos (pc_threads=4) frente al limitador adaptativo."""
+    lock = threading.Lock()
+    window = collections.deque()
+
+    def fake_request():
+        with lock:
+            now = time.monotonic()
+            while window and now - window[0] > 1.0: window.popleft()
+            window.append(now)
+            over = len(window) > server_rate
+        time.sleep(latency)
+        if over: raise Exception("HTTP Error 429: Too Many Requests")
+        return True
+
+    def fixed(_):
+        try: return fake_request()
+        except Exception: return None
+
+    adaptive_limiter = AdaptiveLimiter(start=4, max_limit=32, rate=5.0, max_rate=100.0, cooldown=0.5)
+    def adaptive(_):
+        try: return adaptive_limiter.run(fake_request)
+        except Exception: return None
+
+    print(f"\n⏱️ Verificación simulada de {songs} canciones ({latency * 1000:.0f} ms/petición, 429 por encima de {server_rate:.0f} req/s)")
+    for name, fn, workers in (("Hilos fijos (4)", fixed, 4), ("Adaptativo", adaptive, 32)):
+        window.clear()
+        t0 = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(fn, range(songs)))
+        t = time.perf_counter() - t0
+        failed = sum(1 for r in results if r is None)
+        print(f"   {name + ':':<18}{t:7.2f} s | {songs / t:6.1f} canciones/s | sin verificar: {failed}")
+    print(f"   Limitador: {adaptive_limiter.summary()}\n")
+
+BENCHMARKS = {
+    "gain": bench_gain,
+    "queue": bench_queue,
+    "meta": bench_meta,
+    "ytdl": bench_ytdl,
+    "limiter": bench_limiter,
+}
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--texto", action="store_true")
     ap.add_argument("--radio-init", choices=["on", "off"], default="on")
     ap.add_argument("--micro-init", choices=["on", "off"], default=None)
     ap.add_argument("--listar-micros", action="store_true")
+    ap.add_argument("--bench", choices=sorted(BENCHMARKS), default=None)
     args = ap.parse_args()
 
     if args.listar_micros:
         list_microphones()
         return
 
+    if args.bench:
+        BENCHMARKS[args.bench]()
+        return
+
 
 
     cleanup_temp_files(prefix=TEMP_AUDIO_PREFIX)
@@ -1932,22 +4198,6 @@ def main():
     # Hotwords
     hotwords = player.config.get("hotwords", ["rafa"])
 
-    # --- Background Update Thread ---
-    def update_loop():
-        logging.info("DEBUG: update_loop iniciado.")
-        try:
-            while True:
-                player.update()
-                time.sleep(0.5)
-        except BaseException as e:
-            logging.error(f"DEBUG: update_loop CRASH: {e}")
-            import traceback
-            traceback.print_exc()
-        finally:
-            logging.info("DEBUG: update_loop finalizado.")
-
-    threading.Thread(target=update_loop, daemon=True).start()
-
     # --- Start Voice Loop in Thread ---
     v_loop = VoiceLoop(player, hotwords)
     threading.Thread(target=v_loop.run, daemon=True).start()